@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+"""Microbenchmarks of the object and argument processing layer.
+
+Runs offline on synthetic data: no token, no network.  Each benchmark
+runs in a forked child process, so its memory use (growth of the
+maximum resident set size) is measured on its own.
+
+    python benchmark.py                      run, compare with the baseline
+    python benchmark.py -n 10000 1000000     run with these item counts
+    python benchmark.py --save               store the results as baseline
+    python benchmark.py -k Room              only benchmarks matching 'Room'
+
+The exit status is 1 if a benchmark is slower (or uses more memory)
+than its baseline by more than the threshold.  The baseline in the
+repository was taken with the default arguments; store a new one with
+--save before comparing on a different machine.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import traceback
+from datetime import datetime
+from ciscosparkapi import Room, Message, Membership, Person, MemoryTransport
+from ciscosparkapi.restsession import _process_args, _process_fields, \
+    _del_url_query_part, RestSession
+from ciscosparkapi.endpoints import ENDPOINTS
+
+
+BASELINE = 'benchmark_baseline.json'
+
+# synthetic values by attribute type
+_VALUES = {
+    basestring: u'Y2lzY29zcGFyazovL3VzL1JPT00vYmJjZWIxYWQtNDNmMS0zYjU4',
+    datetime: u'2016-04-21T19:01:55.966Z',
+    list: [u'https://api.ciscospark.com/v1/contents/Y2lzY29zcGFyazov'],
+    bool: True,
+}
+
+
+def _item(cls, i):
+    """a synthetic JSON dict of a cls object, with a unique id"""
+    data = dict((key, _VALUES[attr[1]]) for key, attr in cls._API.items())
+    data['id'] = u'%s%08d' % (data['id'], i)
+    return data
+
+
+def _object_benchmarks(cls):
+    name = cls.__name__
+
+    def init(n):
+        items = [_item(cls, i) for i in xrange(n)]
+        return lambda: [cls(item) for item in items]
+
+    def copy(n):
+        source = cls(_item(cls, 0))
+        objects = [cls() for i in xrange(n)]
+        return lambda: [obj.__copy__(source) for obj in objects]
+
+    def dumps(n):
+        objects = [cls(_item(cls, i)) for i in xrange(n)]
+        return lambda: [obj.dumps() for obj in objects]
+
+    def loads(n):
+        strings = [str(cls(_item(cls, i)).dumps()) for i in xrange(n)]
+        objects = [cls() for i in xrange(n)]
+        return lambda: [obj.loads(s) for obj, s in zip(objects, strings)]
+
+    return [('%s.__init__' % name, init), ('%s.__copy__' % name, copy),
+            ('%s.dumps' % name, dumps), ('%s.loads' % name, loads)]
+
+
+# _process_args and _process_fields pop from the argument dicts, so
+# these benchmarks return (prepare, run): prepare() builds fresh
+# arguments before each run, outside of the timing
+
+
+def _get_args(n):
+    return [{'roomId': u'Y2lzY29zcGFyazovL3VzL1JPT00v', 'max': 50,
+             'before': datetime(2016, 4, 21, 19, 1, 55), 'erc': 200}
+            for i in xrange(n)]
+
+
+def _args_get(n):
+    apiattr = ['roomId', 'before', 'beforeMessage', 'max']
+    return (lambda: _get_args(n),
+            lambda args: [_process_args('GET', apiattr, a) for a in args])
+
+
+def _fields_get(n):
+    endpoint = ENDPOINTS['messages.list']
+    return (lambda: _get_args(n),
+            lambda args: [_process_fields(endpoint, a) for a in args])
+
+
+def _args_post(n):
+    apiattr = ['roomId', 'toPersonId', 'toPersonEmail', 'text', 'markdown',
+               'html', 'files']
+
+    def prepare():
+        return [{'roomId': u'Y2lzY29zcGFyazovL3VzL1JPT00v',
+                 'text': u'hello \u2603',
+                 'files': ['http://example.com/x.png']}
+                for i in xrange(n)]
+    return (prepare,
+            lambda args: [_process_args('POST', apiattr, a) for a in args])
+
+
+def _urljoin(n):
+    session = RestSession('token', transport=MemoryTransport())
+    urls = ['rooms/Y2lzY29zcGFyazovL3VzL1JPT00v%08d' % i for i in xrange(n)]
+    return lambda: [session.urljoin(url) for url in urls]
+
+
+def _del_query(n):
+    urls = ['https://api.ciscospark.com/v1/messages?roomId=Y2lzY29z&'
+            'max=50&beforeMessage=Y2lzY29zcGFyazov%08d' % i
+            for i in xrange(n)]
+    return lambda: [_del_url_query_part(url, 'max') for url in urls]
+
+
+BENCHMARKS = (_object_benchmarks(Room) + _object_benchmarks(Message) +
+              _object_benchmarks(Membership) + _object_benchmarks(Person) +
+              [('_process_args GET', _args_get),
+               ('_process_args POST', _args_post),
+               ('_process_fields GET', _fields_get),
+               ('RestSession.urljoin', _urljoin),
+               ('_del_url_query_part', _del_query)])
+
+
+def _maxrss():
+    """maximum resident set size in KB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _measure(setup, n, repeat):
+    """best time per operation (us) and memory growth (KB) of a benchmark
+
+    setup(n) returns run(), or (prepare, run) if each run needs fresh
+    fixtures, which are then built by prepare() and passed to run().
+    The memory growth is that of the runs, without the fixtures.
+    """
+    run = setup(n)
+    prepare = None
+    if isinstance(run, tuple):
+        prepare, run = run
+        fixtures = prepare()
+    rss = _maxrss()
+    best = None
+    for i in xrange(repeat):
+        if prepare is not None:
+            if i:
+                del fixtures
+                fixtures = prepare()
+            start = time.time()
+            result = run(fixtures)
+        else:
+            start = time.time()
+            result = run()
+        elapsed = time.time() - start
+        del result
+        best = elapsed if best is None else min(best, elapsed)
+    return {'us': best * 1e6 / n, 'kb': _maxrss() - rss}
+
+
+def _run_forked(setup, n, repeat):
+    """_measure in a child process, to measure its memory use alone"""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        status = 0
+        try:
+            os.write(write_fd, json.dumps(_measure(setup, n, repeat)))
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        finally:
+            os._exit(status)
+    os.close(write_fd)
+    data = ''
+    while True:
+        chunk = os.read(read_fd, 4096)
+        if not chunk:
+            break
+        data += chunk
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    if not data:
+        raise RuntimeError('benchmark failed')
+    return json.loads(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', type=int, nargs='+', default=[10000],
+                        help='number of items per benchmark')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='runs per benchmark, the best one counts')
+    parser.add_argument('-k', default='', help='only names containing this')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+
+    results = {}
+    regressions = 0
+    print('%-26s %8s %10s %10s %8s' % ('benchmark', 'n', 'us/op', 'KB',
+                                       'change'))
+    for name, setup in BENCHMARKS:
+        if args.k not in name:
+            continue
+        for n in args.n:
+            key = '%s/%d' % (name, n)
+            result = results[key] = _run_forked(setup, n, args.repeat)
+            change = ''
+            base = baseline.get(key)
+            if base:
+                ratio = result['us'] / base['us'] - 1
+                change = '%+.0f%%' % (ratio * 100)
+                # memory below 1 MB is noise
+                memory = result['kb'] > max(1024, base['kb'] *
+                                            (1 + args.threshold))
+                if ratio > args.threshold or memory:
+                    change += ' REGRESSION'
+                    regressions += 1
+            print('%-26s %8d %10.2f %10d %8s' % (name, n, result['us'],
+                                                 result['kb'], change))
+
+    if args.save:
+        with open(args.baseline, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+        print('baseline saved to %s' % args.baseline)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
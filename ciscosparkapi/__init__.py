@@ -1,28 +1,109 @@
+import sys
+import types
+import importlib
+import threading
 import exceptions
 from restsession import RestSession
-from api.rooms import Room, RoomsAPI
-from api.messages import Message, MessagesAPI
-from api.memberships import Membership, MembershipsAPI
-from api.people import Person, PeopleAPI
+
+
+# names exported by the package, imported on first attribute access to
+# keep the import of the package itself cheap
+_LAZY_ATTRS = {
+    'RequestsTransport': 'ciscosparkapi.transport',
+    'Urllib3Transport': 'ciscosparkapi.transport',
+    'MemoryTransport': 'ciscosparkapi.transport',
+    'RateBudget': 'ciscosparkapi.ratelimit',
+    'SharedRateBudget': 'ciscosparkapi.ratelimit',
+    'PriorityScheduler': 'ciscosparkapi.scheduler',
+    'CircuitBreakers': 'ciscosparkapi.breaker',
+    'profile': 'ciscosparkapi.profiling',
+    'crawl': 'ciscosparkapi.crawl',
+    'Room': 'ciscosparkapi.api.rooms',
+    'RoomsAPI': 'ciscosparkapi.api.rooms',
+    'Message': 'ciscosparkapi.api.messages',
+    'MessagesAPI': 'ciscosparkapi.api.messages',
+    'Membership': 'ciscosparkapi.api.memberships',
+    'MembershipsAPI': 'ciscosparkapi.api.memberships',
+    'Person': 'ciscosparkapi.api.people',
+    'dumps_many': 'ciscosparkapi.api.sparkobject',
+    'loads_many': 'ciscosparkapi.api.sparkobject',
+    'PeopleAPI': 'ciscosparkapi.api.people',
+}
+
+# import time budget for 'import ciscosparkapi' in milliseconds, the best
+# of several runs with warm bytecode; enforced by tests/test_import.py
+IMPORT_TIME_BUDGET = 25
+
+
+class _LazyAPI(object):
+    """descriptor creating an API wrapper on first access"""
+
+    def __init__(self, attr, module, name):
+        super(_LazyAPI, self).__init__()
+        self._attr = attr
+        self._module = module
+        self._name = name
+        self._lock = threading.Lock()
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        with self._lock:
+            wrapper = instance.__dict__.get(self._attr)
+            if wrapper is None:
+                module = importlib.import_module(self._module)
+                wrapper = getattr(module, self._name)(instance)
+                # cache on the instance, the descriptor is not consulted
+                # again for this instance
+                instance.__dict__[self._attr] = wrapper
+        return wrapper
 
 
 class CiscoSparkAPI(object):
-    """Cisco Spark API wrapper class."""
+    """Cisco Spark API wrapper class.
+
+    The API wrappers (rooms, messages, memberships and people) are
+    created on first access.
+
+    With negative_ttl > 0, people and memberships which were not found
+    (404) are remembered for that many seconds, see NegativeCache.
+
+    With identity_map, an ID always resolves to the same Spark object
+    instance (while it is in use) and ID strings are shared, see
+    IdentityMap.
+    """
+
+    rooms = _LazyAPI('rooms', 'ciscosparkapi.api.rooms', 'RoomsAPI')
+    messages = _LazyAPI('messages', 'ciscosparkapi.api.messages',
+                        'MessagesAPI')
+    memberships = _LazyAPI('memberships', 'ciscosparkapi.api.memberships',
+                           'MembershipsAPI')
+    people = _LazyAPI('people', 'ciscosparkapi.api.people', 'PeopleAPI')
 
-    def __init__(self, access_token, base_url=None, timeout=None):
+    def __init__(self, access_token, base_url=None, timeout=None,
+                 transport=None, coalesce=False, rate_budget=None,
+                 codec=None, negative_ttl=0, circuit_breakers=None,
+                 identity_map=False):
         # Process args
         assert isinstance(access_token, basestring)
         # Process kwargs
         session_args = {}
         if base_url:  session_args['base_url'] = base_url
         if timeout:  session_args['timeout'] = timeout
+        if transport:  session_args['transport'] = transport
+        if coalesce:  session_args['coalesce'] = coalesce
+        if rate_budget:  session_args['rate_budget'] = rate_budget
+        if codec:  session_args['codec'] = codec
+        if circuit_breakers:  session_args['circuit_breakers'] = circuit_breakers
         # Create API session
         self.session = RestSession(access_token, **session_args)
-        # Setup Spark API wrappers
-        self.rooms = RoomsAPI(self)
-        self.messages = MessagesAPI(self)
-        self.memberships = MembershipsAPI(self)
-        self.people = PeopleAPI(self)
+        # time to live of the not-found caches of the API wrappers
+        self.negative_ttl = negative_ttl
+        # one Spark object instance per ID, see ciscosparkapi.cache
+        self.identity_map = None
+        if identity_map:
+            from ciscosparkapi.cache import IdentityMap
+            self.identity_map = IdentityMap()
 
     @property
     def access_token(self):
@@ -35,3 +116,43 @@ class CiscoSparkAPI(object):
     @property
     def timeout(self):
         return self.session.timeout
+
+    def warmup(self, n=1, interval=None):
+        """Open n connections to the API in advance.
+
+        The first calls then skip the DNS, TCP and TLS handshakes.
+
+        Args:
+            n (int): number of keep-alive connections, at most the
+                transport's pool size
+            interval (float): if set, check the idle connections every
+                interval seconds in the background and open dropped
+                ones again, until the transport is closed
+
+        Returns:
+            The number of connections opened.
+        """
+        return self.session.warmup(n, interval)
+
+
+class _LazyModule(types.ModuleType):
+    """package module importing the names in _LAZY_ATTRS on first access"""
+
+    def __getattr__(self, name):
+        try:
+            module = _LAZY_ATTRS[name]
+        except KeyError:
+            raise AttributeError(name)
+        value = getattr(importlib.import_module(module), name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_LAZY_ATTRS))
+
+
+_module = _LazyModule(__name__, __doc__)
+_module.__dict__.update(sys.modules[__name__].__dict__)
+# keep the original module alive, its globals are used by the code above
+_module._original = sys.modules[__name__]
+sys.modules[__name__] = _module
@@ -1,5 +1 @@
-import sparkobject
-import rooms
-import messages
-import memberships
-import people
\ No newline at end of file
+# the API modules are imported on demand, see ciscosparkapi._LAZY_ATTRS
@@ -1,9 +1,17 @@
 """Spark - Membership API - wrapper classes."""
 
+import time
+import threading
 from collections import OrderedDict
 from ciscosparkapi.exceptions import ciscosparkapiException
-from ciscosparkapi.helperfunc import utf8, sparkISO8601
-from ciscosparkapi.api.sparkobject import SparkBaseObject, SparkBaseAPI
+from ciscosparkapi.endpoints import ENDPOINTS
+from ciscosparkapi.helperfunc import utf8, sparkISO8601, bounded_imap, \
+    DEFAULT_WORKERS
+from ciscosparkapi.api.rooms import Room
+from ciscosparkapi.api.people import Person
+from ciscosparkapi.cache import NegativeCache
+from ciscosparkapi.api.sparkobject import SparkBaseObject, SparkBaseAPI, \
+    SparkIterator
 from datetime import datetime
 
 
@@ -39,14 +47,211 @@ class Membership(SparkBaseObject):
         super(Membership, self).__init__(arg)
 
 
+def _email(email):
+    """normalized email address, for comparisons"""
+    return email.strip().lower() if email else None
+
+
+class MembershipDiff(object):
+    """The membership changes needed to bring a room in sync.
+
+    Attributes:
+        room (Room): the room
+        add (list): (Person, isModerator) tuples of people to be added
+        remove (list): Membership objects to be deleted
+        promote (list): Membership objects to be made moderator
+        demote (list): Membership objects to be made non-moderator
+        errors (list): (action, target, exception) tuples of the changes
+            which failed when the diff was applied
+    """
+
+    def __init__(self, room):
+        super(MembershipDiff, self).__init__()
+        self.room = room
+        self.add = []
+        self.remove = []
+        self.promote = []
+        self.demote = []
+        self.errors = []
+
+    def __len__(self):
+        return len(self.add) + len(self.remove) + len(self.promote) + \
+            len(self.demote)
+
+    def __str__(self):
+        return '(%s: %d to add, %d to remove, %d to promote, ' \
+               '%d to demote, %d errors)' % \
+               (self.room.id, len(self.add), len(self.remove),
+                len(self.promote), len(self.demote), len(self.errors))
+
+
+# default time to live of the rooms in a MembershipGraph, in seconds
+_GRAPH_TTL = 300
+
+
+class MembershipGraph(object):
+    """Cached room <-> person membership graph.
+
+    The memberships of a room are listed once and kept for 'ttl' seconds.
+    members() and is_member() load a room if it is not cached (or
+    expired), rooms_of() answers from the rooms loaded into the graph,
+    reloading the expired ones.  load() loads many rooms concurrently.
+    MembershipsAPI.create(), update() and delete() update the graph
+    immediately.
+
+    People are identified by Person object, person ID or email address.
+    The graph keeps the room and person of each membership as they were
+    when it was linked, so a membership updated in place (e.g. by the
+    identity map of the CiscoSparkAPI) is still unlinked correctly.
+    """
+
+    def __init__(self, memberships_api, ttl=_GRAPH_TTL):
+        super(MembershipGraph, self).__init__()
+        self._memberships_api = memberships_api
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        # roomId -> (load time, {membershipId: Membership})
+        self._rooms = {}
+        # personId or email -> {roomId: membershipId}
+        self._people = {}
+        # membershipId -> (roomId, person keys) as linked
+        self._links = {}
+
+    @staticmethod
+    def _person_keys(person):
+        if isinstance(person, Person):
+            keys = [person.id] + [_email(e) for e in person.emails or []]
+            return [k for k in keys if k]
+        if '@' in person:
+            return [_email(person)]
+        return [person]
+
+    def _link(self, membership):
+        keys = filter(None, [membership.personId,
+                             _email(membership.personEmail)])
+        for key in keys:
+            self._people.setdefault(key, {})[membership.roomId] = \
+                membership.id
+        self._links[membership.id] = (membership.roomId, keys)
+
+    def _unlink(self, membershipId):
+        roomId, keys = self._links.pop(membershipId, (None, ()))
+        for key in keys:
+            rooms = self._people.get(key, {})
+            rooms.pop(roomId, None)
+            if not rooms:
+                self._people.pop(key, None)
+        return roomId
+
+    def _set_room(self, roomId, memberships):
+        with self._lock:
+            self._drop_room(roomId)
+            self._rooms[roomId] = (time.time(),
+                                   dict((m.id, m) for m in memberships))
+            for m in memberships:
+                self._link(m)
+
+    def _drop_room(self, roomId):
+        _, memberships = self._rooms.pop(roomId, (None, {}))
+        for membershipId in memberships:
+            self._unlink(membershipId)
+
+    def _fresh(self, roomId):
+        loaded, _ = self._rooms.get(roomId, (None, None))
+        return loaded is not None and time.time() - loaded < self.ttl
+
+    def add(self, membership):
+        """add or replace a membership of a cached room"""
+        with self._lock:
+            if membership.roomId not in self._rooms:
+                return
+            self._unlink(membership.id)
+            self._rooms[membership.roomId][1][membership.id] = membership
+            self._link(membership)
+
+    def discard(self, membership):
+        """remove a membership (Membership or ID)"""
+        if isinstance(membership, Membership):
+            membership = membership.id
+        with self._lock:
+            roomId = self._unlink(membership)
+            if roomId is not None:
+                self._rooms[roomId][1].pop(membership, None)
+
+    def invalidate(self, room=None):
+        """drop a room (Room or ID) from the graph, or all rooms"""
+        with self._lock:
+            if room is None:
+                self._rooms, self._people = {}, {}
+                self._links = {}
+            else:
+                self._drop_room(room.id if isinstance(room, Room) else room)
+
+    def load(self, rooms, max_workers=DEFAULT_WORKERS):
+        """Load the memberships of the rooms which are not cached.
+
+        Args:
+            rooms (iterable): Room objects or room IDs
+            max_workers (int): maximum number of requests in flight
+        """
+        roomIds = set(r.id if isinstance(r, Room) else r for r in rooms)
+        missing = [r for r in roomIds if not self._fresh(r)]
+
+        def fetch(roomId):
+            return list(self._memberships_api.list(room=Room({'id': roomId})))
+
+        for roomId, memberships in bounded_imap(fetch, missing, max_workers,
+                                                ordered=False):
+            self._set_room(roomId, memberships)
+
+    def members(self, room):
+        """list of the Memberships of a room (Room or ID)"""
+        roomId = room.id if isinstance(room, Room) else room
+        self.load([roomId])
+        with self._lock:
+            return self._rooms.get(roomId, (None, {}))[1].values()
+
+    def is_member(self, room, person):
+        """is the person a member of the room (Room or ID)?"""
+        roomId = room.id if isinstance(room, Room) else room
+        self.load([roomId])
+        with self._lock:
+            return any(roomId in self._people.get(key, {})
+                       for key in self._person_keys(person))
+
+    def rooms_of(self, person):
+        """set of the IDs of the rooms in the graph the person is in"""
+        with self._lock:
+            expired = [r for r in self._rooms if not self._fresh(r)]
+        self.load(expired)
+        with self._lock:
+            roomIds = set()
+            for key in self._person_keys(person):
+                roomIds.update(self._people.get(key, {}))
+            return roomIds
+
+
 class MembershipsAPI(SparkBaseAPI):
     """Spark Membership API request wrapper."""
 
     _API_ENTRY_SUFFIX = 'memberships'
+    _API_OBJECT = Membership
 
     def __init__(self, api):
         super(MembershipsAPI, self).__init__()
         self.api = api
+        self._graph = None
+        self._graph_lock = threading.Lock()
+        # IDs of memberships which were not found (404)
+        self.not_found = NegativeCache(getattr(api, 'negative_ttl', 0))
+
+    @property
+    def graph(self):
+        """The MembershipGraph of this API, empty on first access."""
+        with self._graph_lock:
+            if self._graph is None:
+                self._graph = MembershipGraph(self)
+        return self._graph
 
     def list(self, room=None, person=None, email=None, **kwargs):
         """List memberships.
@@ -73,7 +278,7 @@ class MembershipsAPI(SparkBaseAPI):
             max(int): Limit the maximum number of memberships in the response.
 
         Returns:
-            A Membership iterator.
+            A Membership iterator, with a resumable 'cursor'.
 
         Raises:
             SparkApiError: If the list request fails.
@@ -85,18 +290,17 @@ class MembershipsAPI(SparkBaseAPI):
 
         if person:
             assert isinstance(person, Person)
-            kwargs['toPersonId'] = person.id
+            kwargs['personId'] = person.id
 
         if email:
             assert isinstance(email, basestring)
-            kwargs['toPersonEmail'] = email
+            kwargs['personEmail'] = email
 
-        apiattr = ['roomId', 'personId', 'personEmail', 'max']
-        items = self.api.session.get_items(
-            self._API_ENTRY_SUFFIX, apiattr, **kwargs)
-        # Yield membership objects created from the returned items JSON objects
-        for item in items:
-            yield Membership(item)
+        endpoint = ENDPOINTS['memberships.list']
+        items = self.api.session.get_items(endpoint.url(), endpoint, **kwargs)
+        # Return an iterator of Membership objects created from the returned
+        # items JSON objects
+        return SparkIterator(items, self._object)
 
     def create(self, room, person, moderator=False, **kwargs):
         """Creates a membership.
@@ -121,20 +325,26 @@ class MembershipsAPI(SparkBaseAPI):
         kwargs['roomId'] = room.id
         assert isinstance(person, Person)
         if person.id:
-            kwargs['toPersonId'] = person.id
-        if person.email:
-            kwargs['toPersonEmail'] = person.email
-        kwargs['isModerator'] = isModerator
+            kwargs['personId'] = person.id
+        elif person.emails:
+            kwargs['personEmail'] = person.emails[0]
+        kwargs['isModerator'] = moderator
 
-        apiattr = ['roomId', 'personId', 'personEmail', 'isModerator']
         # API request
         # 409 is a valid resonse status_code
         # (meaning 'user already in room')
+        endpoint = ENDPOINTS['memberships.create']
         json_membership_obj = self.api.session.post(
-            self._API_ENTRY_SUFFIX, apiattr, erc=[200, 409], **kwargs)
+            endpoint.url(), endpoint, **kwargs)
         # Return a Membership object created from the response JSON data
         if self.api.session.last_response.status_code == 200:
-            return Membership(json_membership_obj)
+            membership = self._object(json_membership_obj)
+            if self._graph is not None:
+                self._graph.add(membership)
+            # both the membership and the person exist now
+            self.not_found.discard(membership.id)
+            self.api.people.not_found.discard(membership.personId)
+            return membership
         else:
             return None
 
@@ -159,17 +369,28 @@ class MembershipsAPI(SparkBaseAPI):
             membershipId = membership
         else:
             raise ValueError("missing membership Id")
-        apiattr = []
-        # API request
-        return Membership(self.api.session.get(self._uri_append(membershipId), apiattr, erc=[200, 404], **kwargs))
+        if membershipId in self.not_found:
+            return None
+        # API request, 404 is expected
+        endpoint = ENDPOINTS['memberships.details']
+        json_membership_obj = self.api.session.get(
+            endpoint.url(membershipId), endpoint, **kwargs)
+        if self.api.session.last_response.status_code == 200:
+            return self._object(json_membership_obj)
+        else:
+            self.not_found.add(membershipId)
+            return None
 
-    def update(self, membership, **kwargs):
+    def update(self, membership, isModerator=None, **kwargs):
         """Updates properties for a membership object.
 
         Only the 'isModerator' attribute can be modified. 
 
         Args:
-            membership (Membership): The membership object
+            membership (Membership): The membership object, or its ID
+            isModerator (bool): the new moderator state, defaults to the
+                'isModerator' of the membership object; required with an
+                ID.  The membership object is not modified.
 
         Raises:
             SparkApiError: If the create operation fails.
@@ -185,10 +406,18 @@ class MembershipsAPI(SparkBaseAPI):
         else:
             raise ValueError("missing membership Id")
 
-        kwargs['isModerator'] = membership.isModerator
-        apiattr = ['isModerator']
+        if isModerator is None:
+            if not isinstance(membership, Membership):
+                raise ValueError("missing isModerator")
+            isModerator = membership.isModerator
+        kwargs['isModerator'] = isModerator
+        endpoint = ENDPOINTS['memberships.update']
         # API request
-        return Membership(self.api.session.put(self._uri_append(membershipId), apiattr, **kwargs))
+        membership = self._object(self.api.session.put(
+            endpoint.url(membershipId), endpoint, **kwargs))
+        if self._graph is not None:
+            self._graph.add(membership)
+        return membership
 
     def delete(self, membership, **kwargs):
         """Deletes a membership object.
@@ -210,7 +439,133 @@ class MembershipsAPI(SparkBaseAPI):
             membershipId = membership
         else:
             raise ValueError("missing membership Id")
-        apiattr = []
+        endpoint = ENDPOINTS['memberships.delete']
         # API request
-        self.api.session.delete(self._uri_append(
-            membershipId), apiattr, **kwargs)
+        self.api.session.delete(endpoint.url(membershipId), endpoint, **kwargs)
+        if self._graph is not None:
+            self._graph.discard(membershipId)
+
+    def diff(self, room, desired_people, moderators=None, remove=True):
+        """Computes the membership changes for a room, see reconcile().
+
+        Returns:
+            MembershipDiff object
+        """
+        assert isinstance(room, Room)
+        diff = MembershipDiff(room)
+
+        # desired people and moderators by ID and by email
+        desired_ids, desired_emails = {}, {}
+        for person in desired_people:
+            if isinstance(person, basestring):
+                person = Person({'emails': [person]})
+            assert isinstance(person, Person)
+            if person.id:
+                desired_ids[person.id] = person
+            elif person.emails:
+                desired_emails[_email(person.emails[0])] = person
+        mod_ids, mod_emails = set(), set()
+        for person in moderators or []:
+            if isinstance(person, basestring):
+                mod_emails.add(_email(person))
+            else:
+                assert isinstance(person, Person)
+                if person.id:
+                    mod_ids.add(person.id)
+                mod_emails.update(_email(e) for e in person.emails or [])
+
+        # the current members, fetched once
+        current = list(self.list(room=room))
+        members = dict((m.id, m) for m in current)
+        by_person = dict((m.personId, m.id) for m in current)
+        by_email = dict((_email(m.personEmail), m.id) for m in current
+                        if m.personEmail)
+
+        matched = set(by_person[i] for i in
+                      set(desired_ids) & set(by_person))
+        matched |= set(by_email[e] for e in
+                       set(desired_emails) & set(by_email))
+        diff.add = [(desired_ids[i], i in mod_ids) for i in
+                    set(desired_ids) - set(by_person)]
+        diff.add += [(desired_emails[e], e in mod_emails) for e in
+                     set(desired_emails) - set(by_email)]
+        if remove:
+            unmatched = set(members) - matched
+            if unmatched:
+                # never remove the authenticated user
+                me = self.api.people.details('me')
+                unmatched.discard(by_person.get(me.id))
+            diff.remove = [members[i] for i in unmatched]
+        if moderators is not None:
+            for i in matched:
+                m = members[i]
+                is_mod = m.personId in mod_ids or \
+                    _email(m.personEmail) in mod_emails
+                if is_mod and not m.isModerator:
+                    diff.promote.append(m)
+                elif not is_mod and m.isModerator:
+                    diff.demote.append(m)
+        return diff
+
+    def reconcile(self, room, desired_people, moderators=None, remove=True,
+                  dry_run=False, max_workers=DEFAULT_WORKERS):
+        """Brings the memberships of a room in sync with a list of people.
+
+        The current memberships are fetched once, then only the needed
+        changes (adds, removals, moderator changes) are applied,
+        concurrently. The number of requests scales with the number of
+        changes, not with the size of the room.
+
+        Args:
+            room (Room): The room
+            desired_people (iterable): Person objects or email addresses
+                of the people who should be members
+            moderators (iterable): Person objects or email addresses of
+                the people who should be moderators. If None, moderator
+                status is not changed.
+            remove (bool): remove members which are not desired (the
+                authenticated user is never removed)
+            dry_run (bool): only compute the changes
+            max_workers (int): maximum number of requests in flight
+
+        Returns:
+            MembershipDiff object, failed changes are in its 'errors'.
+
+        Raises:
+            SparkApiError: If listing the current memberships fails.
+        """
+        diff = self.diff(room, desired_people, moderators, remove)
+        if dry_run:
+            return diff
+
+        def add(target):
+            person, moderator = target
+            return self.create(room, person, moderator=moderator)
+
+        def remove_member(membership):
+            return self.delete(membership)
+
+        def set_moderator(moderator):
+            def update(membership):
+                return self.update(membership, isModerator=moderator)
+            return update
+
+        changes = [('add', add, t) for t in diff.add] + \
+                  [('remove', remove_member, m) for m in diff.remove] + \
+                  [('promote', set_moderator(True), m)
+                   for m in diff.promote] + \
+                  [('demote', set_moderator(False), m) for m in diff.demote]
+
+        def apply_change(change):
+            name, action, target = change
+            try:
+                action(target)
+            except Exception as e:
+                return e
+            return None
+
+        for (name, action, target), error in bounded_imap(
+                apply_change, changes, max_workers, ordered=False):
+            if error is not None:
+                diff.errors.append((name, target, error))
+        return diff
@@ -2,9 +2,12 @@
 
 from collections import OrderedDict
 from ciscosparkapi.exceptions import ciscosparkapiException
+from ciscosparkapi.endpoints import ENDPOINTS
 from ciscosparkapi.helperfunc import utf8, sparkISO8601
 from ciscosparkapi.api.rooms import RoomsAPI, Room
-from ciscosparkapi.api.sparkobject import SparkBaseObject, SparkBaseAPI
+from ciscosparkapi.api.people import Person
+from ciscosparkapi.api.sparkobject import SparkBaseObject, SparkBaseAPI, \
+    SparkIterator
 from datetime import datetime
 
 
@@ -34,6 +37,14 @@ _API_ATTRS = [('Message ID (string)', basestring),
               ]
 
 
+def _since(since):
+    """the stop function of a 'since' bound, messages arrive newest first"""
+    if not since:
+        return None
+    assert isinstance(since, datetime)
+    return lambda message: message.created < since
+
+
 class Message(SparkBaseObject):
     """Cisco Spark Message Object"""
 
@@ -50,12 +61,67 @@ class MessagesAPI(SparkBaseAPI):
     """Spark Messages API request wrapper."""
 
     _API_ENTRY_SUFFIX = 'messages'
+    _API_OBJECT = Message
 
     def __init__(self, api):
         super(MessagesAPI, self).__init__()
         self.api = api
+        self.outbox = None
+
+    def enable_outbox(self, path, **kwargs):
+        """Send created messages in the background from a durable outbox.
+
+        create() then stores the message in a SQLite file and returns
+        at once, see ciscosparkapi.outbox.
+
+        Args:
+            path (string): the SQLite file
+            **kwargs: Outbox arguments (workers, max_attempts, backoff,
+                callback)
 
-    def list(self, room, **kwargs):
+        Returns:
+            The Outbox.
+        """
+        from ciscosparkapi.outbox import Outbox
+        assert self.outbox is None
+        self.outbox = Outbox(self._send, path, **kwargs)
+        return self.outbox
+
+    def disable_outbox(self, wait=True):
+        """Stop sending from the outbox, create() sends directly again."""
+        if self.outbox is not None:
+            self.outbox.close(wait)
+            self.outbox = None
+
+    def list(self, room, since=None, until=None, predicate=None, **kwargs):
+        """List messages.
+
+        Lists the messages in the given room, newest first.
+
+        This method supports Cisco Spark's implmentation of RFC5988 Web Linking
+        to provide pagination support.  It returns an iterator that
+        incrementally yields all messages returned by the query.  As the
+        messages arrive newest first, a 'since' bound ends the iteration
+        (and the paging) at the first older message.
+
+        Args:
+            room (Room): List messages for a Room object.
+            since (datetime): only messages created at or after this time
+            until (datetime): only messages created before this time
+            predicate (callable): only messages for which predicate(message)
+                is true
+
+        **kwargs:
+            max (int): Limit the maximum number of messages in the response.
+            before (datetime): List messages sent before a date and time
+            beforeMessage (Message): List messages sent before a message
+
+        Returns:
+            A Message iterator, with a resumable 'cursor'.
+
+        Raises:
+            SparkApiError: If the list request fails.
+        """
 
         # Process args
         assert isinstance(room, Room)
@@ -67,22 +133,48 @@ class MessagesAPI(SparkBaseAPI):
             assert isinstance(beforeMessage, Message)
             kwargs['before'] = beforeMessage.created
 
+        if until:
+            assert isinstance(until, datetime)
+            kwargs['before'] = min(until, kwargs.get('before', until))
+
         # API request - get items
         # 'beforeMessage' will never make it to the API
         # as we convert it to 'before' above
-        apiattr = ['roomId', 'before', 'beforeMessage', 'max']
+        endpoint = ENDPOINTS['messages.list']
 
-        # need to pass max=50 (50 being the default)
-        # b/c as of Aug 7th 2016, Spark API does actually
+        # as of Aug 7th 2016, Spark API does actually
         # do paging properly but w/o a max parm it will
         # return the next-link with 'max=None' (nice!)
         # see http://devsupport.ciscospark.com/hc/requests/55389
+        # get_items always sends an explicit 'max' (adaptive page size)
+
+        items = self.api.session.get_items(endpoint.url(), endpoint, **kwargs)
+        # Return an iterator of Message objects created from the returned
+        # items JSON objects
+        return SparkIterator(items, self._object, stop=_since(since),
+                             predicate=predicate)
 
-        items = self.api.session.get_items(
-            self._API_ENTRY_SUFFIX, apiattr, max=50, **kwargs)
-        for item in items:
-            message = Message(item)
-            yield message
+    def resume(self, cursor, priority=None, since=None, predicate=None):
+        """Continue a list() iteration from its cursor.
+
+        The cursor holds the paging state only (including 'until' and
+        'before'): pass the 'since' and 'predicate' of the list() call
+        again.
+
+        Args:
+            cursor (dict): the 'cursor' of a list() iterator
+            priority (string): the priority of the requests
+            since (datetime): only messages created at or after this time
+            predicate (callable): only messages for which predicate(message)
+                is true
+
+        Returns:
+            A Message iterator yielding the remaining messages, with a
+            cursor.
+        """
+        items = self.api.session.resume_items(cursor, priority)
+        return SparkIterator(items, self._object, stop=_since(since),
+                             predicate=predicate)
 
 
     def list_alternative(self, room, **kwargs):
@@ -130,7 +222,7 @@ class MessagesAPI(SparkBaseAPI):
         # API request - get items
         # 'beforeMessage' will never make it to the API
         # as we convert it to 'before' above
-        apiattr = ['roomId', 'before', 'beforeMessage', 'max']
+        endpoint = ENDPOINTS['messages.list']
 
         cursor = kwargs.pop('before', datetime.utcnow())
         assert isinstance(cursor, datetime)
@@ -138,12 +230,12 @@ class MessagesAPI(SparkBaseAPI):
         while cursor > room.created:
             counter = 0
             items = self.api.session.get_items(
-                self._API_ENTRY_SUFFIX, apiattr, max=50, before=cursor, **kwargs)
+                endpoint.url(), endpoint, before=cursor, **kwargs)
             for item in items:
                 counter = counter + 1
                 # Yield message objects created from the returned items JSON
                 # objects
-                message = Message(item)
+                message = self._object(item)
                 yield message
             if counter > 0:
                 cursor = message.created
@@ -165,13 +257,17 @@ class MessagesAPI(SparkBaseAPI):
             text (string): the text (as alternatetext when Markdown or HTML is sent)
             markdown (string): the text in Markdown
             html (string): the text in HTML
-            files (string): attachment
+            files (list): attachment, either URLs or open file objects;
+                file objects are streamed as multipart/form-data
 
         Raises:
             SparkApiError: If the create operation fails.
+            ciscosparkapiException: If file objects are sent through the
+                outbox.
 
         Returns:
-            Message object
+            Message object, or the outbox id of the message if the
+            outbox is enabled
         """
 
         if room:
@@ -186,11 +282,47 @@ class MessagesAPI(SparkBaseAPI):
             assert isinstance(email, basestring)
             kwargs['toPersonEmail'] = email
 
+        if self.outbox is not None:
+            files = kwargs.get('files')
+            if files and hasattr(files[0], 'read'):
+                raise ciscosparkapiException(
+                    'file objects cannot be sent through the outbox')
+            return self.outbox.put(kwargs)
+        return self._send(**kwargs)
+
+    def _send(self, **kwargs):
         # API request
-        apiattr = ['roomId', 'toPersonId', 'toPersonEmail',
-                   'text', 'markdown', 'html', 'files']
+        endpoint = ENDPOINTS['messages.create']
+        # local files are uploaded as multipart/form-data
+        files = kwargs.get('files')
+        if files and hasattr(files[0], 'read'):
+            kwargs.pop('files')
+            fields = dict((k, kwargs.pop(k)) for k in endpoint if k in kwargs)
+            return self._object(self.api.session.post_multipart(
+                endpoint.url(), fields,
+                [('files', f) for f in files], **kwargs))
         # Return a new Message object
-        return Message(self.api.session.post(self._API_ENTRY_SUFFIX, apiattr, **kwargs))
+        return self._object(self.api.session.post(endpoint.url(), endpoint, **kwargs))
+
+    def download(self, uri, dest, parallel=1):
+        """ Downloads a file attachment of a message.
+
+        Args:
+            uri (string): one of the URIs in Message.files
+            dest (string or file): file name or file object to write to
+            parallel (int): number of byte ranges of large files to fetch
+                concurrently
+
+        Raises:
+            SparkApiError: If the download fails.
+
+        Returns:
+            The number of bytes written.
+        """
+        if isinstance(dest, basestring):
+            with open(dest, 'wb') as fp:
+                return self.api.session.download(uri, fp, parallel)
+        return self.api.session.download(uri, dest, parallel)
 
     def details(self, message, **kwargs):
         """ Shows details for a message, by message ID.
@@ -213,9 +345,9 @@ class MessagesAPI(SparkBaseAPI):
             messageId = message
 
         # API request
-        apiattr = ['messageId']
+        endpoint = ENDPOINTS['messages.details']
         # Return a Message object with details
-        return Message(self.api.session.get(self._uri_append(messageId), apiattr, **kwargs))
+        return self._object(self.api.session.get(endpoint.url(messageId), endpoint, **kwargs))
 
     def delete(self, message, **kwargs):
         """ Deletes a message, by message ID.
@@ -238,5 +370,5 @@ class MessagesAPI(SparkBaseAPI):
             messageId = message
 
         # API request
-        apiattr = ['messageId']
-        self.api.session.delete(self._uri_append(messageId), apiattr, **kwargs)
+        endpoint = ENDPOINTS['messages.delete']
+        self.api.session.delete(endpoint.url(messageId), endpoint, **kwargs)
@@ -2,8 +2,11 @@
 
 from collections import OrderedDict
 from ciscosparkapi.exceptions import ciscosparkapiException
+from ciscosparkapi.endpoints import ENDPOINTS
 from ciscosparkapi.helperfunc import utf8, sparkISO8601
-from ciscosparkapi.api.sparkobject import SparkBaseObject, SparkBaseAPI
+from ciscosparkapi.cache import NegativeCache
+from ciscosparkapi.api.sparkobject import SparkBaseObject, SparkBaseAPI, \
+    SparkIterator
 from datetime import datetime
 
 
@@ -37,10 +40,13 @@ class PeopleAPI(SparkBaseAPI):
     """Spark Messages API request wrapper."""
 
     _API_ENTRY_SUFFIX = 'people'
+    _API_OBJECT = Person
 
     def __init__(self, api):
         super(PeopleAPI, self).__init__()
         self.api = api
+        # IDs of people which were not found (404)
+        self.not_found = NegativeCache(getattr(api, 'negative_ttl', 0))
 
     def list(self, email=None, name=None, **kwargs):
         """List people.
@@ -61,7 +67,7 @@ class PeopleAPI(SparkBaseAPI):
             max (int): Limit the maximum number of persons in the response.
 
         Returns:
-            A Person iterator.
+            A Person iterator, with a resumable 'cursor'.
 
         Raises:
             SparkApiError: If the list request fails.
@@ -73,15 +79,14 @@ class PeopleAPI(SparkBaseAPI):
 
         if name:
             assert isinstance(name, basestring)
-            kwargs['displayName'] = displayName
+            kwargs['displayName'] = name
 
         # API request - get items
-        querylist = ['email', 'displayName', 'max']
-        items = self.api.session.get_items(
-            self._API_ENTRY_SUFFIX, querylist, **kwargs)
-        # Yield message objects created from the returned items JSON objects
-        for item in items:
-            yield Person(item)
+        endpoint = ENDPOINTS['people.list']
+        items = self.api.session.get_items(endpoint.url(), endpoint, **kwargs)
+        # Return an iterator of Person objects created from the returned
+        # items JSON objects
+        return SparkIterator(items, self._object)
 
     def details(self, person='me', **kwargs):
         """get details of a person.
@@ -103,12 +108,16 @@ class PeopleAPI(SparkBaseAPI):
         elif isinstance(person, basestring):
             personId = person
 
-        # API request
-        querylist = ['personId']
-        json_person_obj = self.api.session.get(self._uri_append(
-            personId), querylist, erc=[200, 404], **kwargs)
+        if personId in self.not_found:
+            return None
+
+        # API request, 404 is expected
+        endpoint = ENDPOINTS['people.details']
+        json_person_obj = self.api.session.get(
+            endpoint.url(personId), endpoint, **kwargs)
         if self.api.session.last_response.status_code == 200:
             # Return a Room object created from the response JSON data
-            return Person(json_person_obj)
+            return self._object(json_person_obj)
         else:
+            self.not_found.add(personId)
             return None
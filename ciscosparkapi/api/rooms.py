@@ -1,9 +1,12 @@
 """Spark - Rooms API - wrapper classes."""
 
+import threading
 from collections import OrderedDict
 from ciscosparkapi.exceptions import ciscosparkapiException
+from ciscosparkapi.endpoints import ENDPOINTS
 from ciscosparkapi.helperfunc import utf8
-from ciscosparkapi.api.sparkobject import SparkBaseObject, SparkBaseAPI
+from ciscosparkapi.api.sparkobject import SparkBaseObject, SparkBaseAPI, \
+    SparkIterator
 from datetime import datetime
 
 _API_KEYS = ['id',
@@ -36,14 +39,153 @@ class Room(SparkBaseObject):
         return self.title
 
 
+# page size of incremental RoomIndex refreshes, which usually stop early
+_INDEX_PAGE_SIZE = 100
+
+# the Room attributes RoomIndex looks rooms up by
+_INDEX_KEYS = ('title', 'type', 'teamId')
+
+
+class RoomIndex(object):
+    """In-memory index of the rooms visible to the authenticated user.
+
+    Rooms can be looked up by id, title, type and teamId without any
+    request.  refresh() updates the index incrementally: rooms are listed
+    by last activity (newest first) and listing stops at the first room
+    whose lastActivity did not change.  A full refresh (which also drops
+    deleted rooms) re-reads all rooms.  RoomsAPI.create(), update() and
+    delete() update the index immediately.
+
+    The index keeps the indexed values of each room as they were when it
+    was added, so a Room updated in place (e.g. by the identity map of
+    the CiscoSparkAPI) is still re-indexed and refreshed correctly.
+    """
+
+    def __init__(self, rooms_api):
+        super(RoomIndex, self).__init__()
+        self._rooms_api = rooms_api
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self):
+        self._by_id = {}
+        # roomId -> the indexed values (and lastActivity) of the room
+        self._indexed = {}
+        self._by_key = dict((key, {}) for key in _INDEX_KEYS)
+
+    def _unindex(self, roomId):
+        """remove a room from the title/type/teamId indexes"""
+        values = self._indexed.pop(roomId, None)
+        if values is None:
+            return
+        for key in _INDEX_KEYS:
+            index = self._by_key[key]
+            rooms = index.get(values[key], {})
+            rooms.pop(roomId, None)
+            if not rooms:
+                index.pop(values[key], None)
+
+    def add(self, room):
+        """add or replace a room"""
+        assert isinstance(room, Room)
+        with self._lock:
+            self._unindex(room.id)
+            self._by_id[room.id] = room
+            values = dict((key, getattr(room, key))
+                          for key in _INDEX_KEYS + ('lastActivity',))
+            self._indexed[room.id] = values
+            for key in _INDEX_KEYS:
+                if values[key] is not None:
+                    self._by_key[key].setdefault(values[key], {})[room.id] = \
+                        room
+
+    def discard(self, room):
+        """remove a room (Room or ID), if it is in the index"""
+        roomId = room.id if isinstance(room, Room) else room
+        with self._lock:
+            self._by_id.pop(roomId, None)
+            self._unindex(roomId)
+
+    def refresh(self, full=False):
+        """Update the index from the Spark API.
+
+        Args:
+            full (bool): re-read all rooms instead of only the rooms
+                with new activity
+
+        Returns:
+            The number of rooms added or updated.
+        """
+        if full:
+            rooms = list(self._rooms_api.list())
+            with self._lock:
+                self._clear()
+                for room in rooms:
+                    self.add(room)
+            return len(rooms)
+        count = 0
+        for room in self._rooms_api.list(sortBy='lastactivity',
+                                         max=_INDEX_PAGE_SIZE):
+            with self._lock:
+                old = self._indexed.get(room.id)
+            if old is not None and old['lastActivity'] == room.lastActivity:
+                break
+            self.add(room)
+            count += 1
+        return count
+
+    def get(self, roomId):
+        """the Room with that ID, or None"""
+        return self._by_id.get(roomId)
+
+    def _lookup(self, key, value):
+        with self._lock:
+            return self._by_key[key].get(value, {}).values()
+
+    def by_title(self, title):
+        """list of the Rooms with that title"""
+        return self._lookup('title', title)
+
+    def by_type(self, type):
+        """list of the Rooms of that type ('group' or 'direct')"""
+        return self._lookup('type', type)
+
+    def by_team(self, teamId):
+        """list of the Rooms of that team"""
+        return self._lookup('teamId', teamId)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, roomId):
+        return roomId in self._by_id
+
+    def __iter__(self):
+        with self._lock:
+            return iter(self._by_id.values())
+
+
 class RoomsAPI(SparkBaseAPI):
     """Spark Rooms API request wrapper."""
 
     _API_ENTRY_SUFFIX = 'rooms'
+    _API_OBJECT = Room
 
     def __init__(self, api):
         super(RoomsAPI, self).__init__()
         self.api = api
+        self._index = None
+        self._index_lock = threading.Lock()
+
+    @property
+    def index(self):
+        """The RoomIndex of this API, fully refreshed on first access."""
+        with self._index_lock:
+            if self._index is None:
+                index = RoomIndex(self)
+                index.refresh(full=True)
+                self._index = index
+        return self._index
 
     def list(self, **kwargs):
         """List rooms.
@@ -61,22 +203,22 @@ class RoomsAPI(SparkBaseAPI):
         **kwargs:
             teamId (string): Limit the rooms to those associated with a team, by ID.
             max (int): Limits the maximum number of rooms in the response.
+            sortBy (string): 'id', 'lastactivity' or 'created'
             type(string):
                 'direct': returns all 1-to-1 rooms.
                 'group': returns all group rooms.
 
         Returns:
-            A Room iterator.
+            A Room iterator, with a resumable 'cursor'.
 
         Raises:
             SparkApiError: If the list request fails.
         """
-        apiparm = ['teamId', 'max,', 'type']
-        items = self.api.session.get_items(
-            self._API_ENTRY_SUFFIX, apiparm, **kwargs)
-        # Yield Room objects created from the returned items JSON objects
-        for item in items:
-            yield Room(item)
+        endpoint = ENDPOINTS['rooms.list']
+        items = self.api.session.get_items(endpoint.url(), endpoint, **kwargs)
+        # Return an iterator of Room objects created from the returned
+        # items JSON objects
+        return SparkIterator(items, self._object)
 
     def create(self, title, **kwargs):
         """Creates a room.
@@ -94,8 +236,11 @@ class RoomsAPI(SparkBaseAPI):
         """
         assert isinstance(title, str) and len(title) > 0
         kwargs['title'] = title
-        apiparm = ['title', 'teamId']
-        return Room(self.api.session.post(self._API_ENTRY_SUFFIX, apiparm, **kwargs))
+        endpoint = ENDPOINTS['rooms.create']
+        room = self._object(self.api.session.post(endpoint.url(), endpoint, **kwargs))
+        if self._index is not None:
+            self._index.add(room)
+        return room
 
     def details(self, room, **kwargs):
         """Gets the details of a room.
@@ -112,8 +257,8 @@ class RoomsAPI(SparkBaseAPI):
             roomId = room
         else:
             raise ValueError("missing room Id")
-        apiparm = []
-        return Room(self.api.session.get(self._uri_append(roomId), apiparm, **kwargs))
+        endpoint = ENDPOINTS['rooms.details']
+        return self._object(self.api.session.get(endpoint.url(roomId), endpoint, **kwargs))
 
     def update(self, room, **kwargs):
         """Updates details for a room. Only change of the title is
@@ -134,12 +279,15 @@ class RoomsAPI(SparkBaseAPI):
         if isinstance(room, Room):
             roomId = room.id
             kwargs['title'] = room.title
-        elif isinstance(message, basestring):
+        elif isinstance(room, basestring):
             roomId = room
         else:
             raise ValueError("missing room Id")
-        apiparm = ['title']
-        return Room(self.api.session.put(self._uri_append(roomId), apiparm, **kwargs))
+        endpoint = ENDPOINTS['rooms.update']
+        room = self._object(self.api.session.put(endpoint.url(roomId), endpoint, **kwargs))
+        if self._index is not None:
+            self._index.add(room)
+        return room
 
     def delete(self, room, **kwargs):
         """Delete a room.
@@ -155,10 +303,11 @@ class RoomsAPI(SparkBaseAPI):
         """
         if isinstance(room, Room):
             roomId = room.id
-        elif isinstance(message, basestring):
+        elif isinstance(room, basestring):
             roomId = room
         else:
             raise ValueError("missing room Id")
-        apiparm = ['roomId']
-        self.api.session.delete(
-            '/'.join((self._API_ENTRY_SUFFIX, roomId)), apiparm, **kwargs)
+        endpoint = ENDPOINTS['rooms.delete']
+        self.api.session.delete(endpoint.url(roomId), endpoint, **kwargs)
+        if self._index is not None:
+            self._index.discard(roomId)
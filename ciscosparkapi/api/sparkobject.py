@@ -1,8 +1,12 @@
-import json
 import copy
+import time
 from collections import OrderedDict
 from datetime import datetime
-from ciscosparkapi.helperfunc import sparkParseTime, sparkISO8601
+from ciscosparkapi import profiling
+from ciscosparkapi.exceptions import SparkApiError
+from ciscosparkapi.jsoncodec import get_codec, DEFAULT_CODEC
+from ciscosparkapi.helperfunc import sparkParseTime, sparkISO8601, \
+    bounded_imap, DEFAULT_WORKERS
 
 
 def _priv(item):
@@ -22,6 +26,156 @@ def _addValueFn(className, item, docstring):
     setattr(className, item, property(fnGet, fnSet, doc=docstring))
 
 
+def _fields(cls):
+    """ the precompiled (key, private attribute, is datetime) tuples of
+        the _API of cls, computed once per class
+    """
+    fields = cls.__dict__.get('_fields')
+    if fields is None:
+        fields = tuple((key, _priv(key), attr[1] is datetime)
+                       for key, attr in cls._API.items())
+        cls._fields = fields
+    return fields
+
+
+def _serializer(cls):
+    """ a function turning an instance of cls into a JSON-ready dict"""
+    fields = _fields(cls)
+
+    def serialize(obj):
+        attrs = obj.__dict__
+        data = {}
+        for key, priv, is_datetime in fields:
+            value = attrs.get(priv)
+            if value is not None:
+                if is_datetime:
+                    value = sparkISO8601(value)
+                data[key] = value
+        return data
+    return serialize
+
+
+def _deserializer(cls):
+    """ a function creating an instance of cls from a JSON dict"""
+    # set up the class properties, see SparkBaseObject.__init__
+    cls()
+    fields = dict((key, (priv, is_datetime))
+                  for key, priv, is_datetime in _fields(cls))
+    new = cls.__new__
+
+    def deserialize(data):
+        obj = new(cls)
+        attrs = obj.__dict__
+        for key, value in data.iteritems():
+            try:
+                priv, is_datetime = fields[key]
+            except KeyError:
+                raise Exception, ('<%s>: unknown attribute!' % key)
+            if is_datetime:
+                value = sparkParseTime(value)
+            attrs[priv] = value
+        return obj
+    return deserialize
+
+
+def dumps_many(objects, fp, codec=None):
+    """Write Spark objects to a file as JSON Lines (one object per line).
+
+    Objects are serialized one at a time (with a serializer precompiled
+    per class), so memory use does not grow with the number of objects.
+
+    Args:
+        objects (iterable): Spark objects, e.g. a list() iterator
+        fp (file): file object opened for writing
+        codec (string or JSONCodec): JSON codec, defaults to the codec
+            of each object's class (as for dumps())
+
+    Returns:
+        The number of objects written.
+    """
+    codec = get_codec(codec) if codec else None
+    write = fp.write
+    # class -> (serializer, dumps)
+    serializers = {}
+    count = 0
+    for obj in objects:
+        cls = type(obj)
+        serializer = serializers.get(cls)
+        if serializer is None:
+            serializer = serializers[cls] = \
+                (_serializer(cls), (codec or cls._codec).dumps)
+        serialize, dumps = serializer
+        write(dumps(serialize(obj)))
+        write('\n')
+        count += 1
+    return count
+
+
+def loads_many(cls, fp, codec=None):
+    """Read Spark objects of class cls from a JSON Lines file.
+
+    Args:
+        cls (class): the Spark object class, e.g. Room
+        fp (file): file object opened for reading
+        codec (string or JSONCodec): JSON codec, defaults to the codec
+            of cls
+
+    Returns:
+        An iterator of cls objects, one per (non-empty) line.
+    """
+    loads = get_codec(codec).loads if codec else cls._codec.loads
+    deserialize = _deserializer(cls)
+    for line in fp:
+        if line.strip():
+            yield deserialize(loads(line))
+
+
+class SparkIterator(object):
+    """Iterator creating Spark objects from the items of a list request.
+
+    'cursor' is the resumable cursor of the underlying ItemIterator, see
+    SparkBaseAPI.resume().
+
+    Args:
+        items (ItemIterator): the items of the list request
+        cls (callable): the Spark object class, or a function creating
+            the Spark objects from the items
+        stop (callable): stop iterating (and paging) at the first object
+            for which stop(obj) is true
+        predicate (callable): only yield objects for which predicate(obj)
+            is true
+    """
+
+    def __init__(self, items, cls, stop=None, predicate=None):
+        super(SparkIterator, self).__init__()
+        self._items = items
+        self._cls = cls
+        self._stop = stop
+        self._predicate = predicate
+        self._stopped = False
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        while not self._stopped:
+            obj = self._cls(next(self._items))
+            if self._stop is not None and self._stop(obj):
+                # no further items (or pages) are requested
+                self._stopped = True
+                break
+            if self._predicate is None or self._predicate(obj):
+                return obj
+        raise StopIteration
+
+    @property
+    def cursor(self):
+        """the resumable cursor, None once the iteration has stopped"""
+        if self._stopped:
+            return None
+        return self._items.cursor
+
+
 class SparkBaseAPI(object):
     """Base object for all API wrappers of the SparkBaseAPI"""
 
@@ -31,10 +185,78 @@ class SparkBaseAPI(object):
     def _uri_append(self, what):
         return '/'.join((self._API_ENTRY_SUFFIX, what))
 
+    def _object(self, data):
+        """ create the Spark object of this API from its JSON data, or
+            get it from the identity map of the CiscoSparkAPI if it has one
+        """
+        identity_map = getattr(self.api, 'identity_map', None)
+        if identity_map is None:
+            return self._API_OBJECT(data)
+        return identity_map.get(self._API_OBJECT, data)
+
+    def resume(self, cursor, priority=None):
+        """Continue a list() iteration from its cursor.
+
+        The cursor holds the paging state only, a 'since' bound or a
+        predicate of the list() call is not carried over.
+
+        Args:
+            cursor (dict): the 'cursor' of a list() iterator
+            priority (string): the priority of the requests
+
+        Returns:
+            An iterator yielding the remaining objects, with a cursor.
+        """
+        return SparkIterator(self.api.session.resume_items(cursor, priority),
+                             self._object)
+
+    def details_many(self, ids, max_workers=DEFAULT_WORKERS, ordered=True):
+        """Get the details of many objects concurrently.
+
+        Duplicate ids are fetched only once.
+
+        Args:
+            ids (iterable): object IDs or Spark objects
+            max_workers (int): maximum number of requests in flight
+            ordered (bool): yield in input order, otherwise as completed
+
+        Returns:
+            An iterator of (id, object) tuples, object is None if the
+            id was not found (404).
+
+        Raises:
+            SparkApiError: If any other details request fails.
+        """
+        unique = OrderedDict()
+        for objId in ids:
+            if isinstance(objId, SparkBaseObject):
+                objId = objId.id
+            unique[objId] = True
+
+        def fetch(objId):
+            try:
+                return self.details(objId)
+            except SparkApiError as e:
+                if e.response_code == 404:
+                    return None
+                raise
+
+        return bounded_imap(fetch, unique, max_workers, ordered)
+
 
 class SparkBaseObject(object):
     """ Base object for all SparkObjects like messages and rooms """
 
+    # JSON codec used by dumps() and loads(), see set_codec()
+    _codec = DEFAULT_CODEC
+
+    @classmethod
+    def set_codec(cls, codec):
+        """ set the JSON codec by library name or JSONCodec (see
+            ciscosparkapi.jsoncodec) for this class and its subclasses
+        """
+        cls._codec = get_codec(codec)
+
     def __init__(self, arg=None):
         super(SparkBaseObject, self).__init__()
         # does not work for base class
@@ -47,7 +269,18 @@ class SparkBaseObject(object):
             setattr(self.__class__, '_classInitialized', True)
         # initial value provided?
         if arg is not None:
-            self.__copy__(arg)
+            if profiling.active:
+                start = time.time()
+                self.__copy__(arg)
+                profiling.record('objects', time.time() - start)
+            else:
+                self.__copy__(arg)
+
+    def __setstate__(self, state):
+        # unpickling skips __init__, set up the class properties here
+        if not getattr(self.__class__, '_classInitialized', None):
+            self.__class__()
+        self.__dict__.update(state)
 
     def __items__(self):
         data = list()
@@ -67,7 +300,14 @@ class SparkBaseObject(object):
             for key, value in data.items():
                 if hasattr(self.__class__, _priv(key)):
                     if self._API.get(key)[1] == datetime:
-                        setattr(self, _priv(key), sparkParseTime(value))
+                        if profiling.active:
+                            start = time.time()
+                            value = sparkParseTime(value)
+                            profiling.record('parse_time',
+                                             time.time() - start)
+                        else:
+                            value = sparkParseTime(value)
+                        setattr(self, _priv(key), value)
                     else:
                         setattr(self, _priv(key), value)
                 else:
@@ -85,7 +325,7 @@ class SparkBaseObject(object):
             if type(v) == datetime:
                 v = sparkISO8601(v)
             data[k] = v
-        return json.dumps(data)
+        return self._codec.dumps(data)
 
     def loads(self, input):
         """ loads the input JSON string into the object. 
@@ -93,7 +333,7 @@ class SparkBaseObject(object):
 
         assert isinstance(input, str)
         try:
-            data = json.loads(input)
+            data = self._codec.loads(input)
         except ValueError:
             raise Exception, 'invalid JSON'
         self.__copy__(data)
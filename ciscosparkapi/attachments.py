@@ -0,0 +1,172 @@
+"""Streaming upload and download of file attachments."""
+
+
+import os
+import uuid
+import threading
+import mimetypes
+from ciscosparkapi.helperfunc import bounded_imap
+
+
+# chunk size for reading and writing files
+CHUNK_SIZE = 64 * 1024
+
+# files smaller than this are never downloaded in parallel parts
+MIN_PART_SIZE = 1024 * 1024
+
+
+def _file_size(fp):
+    """the number of bytes from the current position to the end of fp"""
+    try:
+        return os.fstat(fp.fileno()).st_size - fp.tell()
+    except (AttributeError, IOError, OSError):
+        position = fp.tell()
+        fp.seek(0, os.SEEK_END)
+        size = fp.tell() - position
+        fp.seek(position)
+        return size
+
+
+def _encode(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+class MultipartStream(object):
+    """A multipart/form-data body which reads the files as it is sent.
+
+    The files are never held in memory as a whole.  Its length is known
+    up front, so it is sent with a Content-Length (not chunked).  The
+    stream can be sent again after rewind(), if the files are seekable.
+
+    Args:
+        fields (dict): form field names and (string) values
+        files (list): (field name, file object) tuples; the file name is
+            taken from the file object's 'name'
+    """
+
+    def __init__(self, fields, files):
+        super(MultipartStream, self).__init__()
+        self.boundary = uuid.uuid4().hex
+        self._parts = []
+        for name, value in sorted(fields.items()):
+            self._parts.append(
+                '--%s\r\nContent-Disposition: form-data; name="%s"'
+                '\r\n\r\n%s\r\n' % (self.boundary, name, _encode(value)))
+        for name, fp in files:
+            filename = os.path.basename(_encode(getattr(fp, 'name', name)))
+            content_type = mimetypes.guess_type(filename)[0] or \
+                'application/octet-stream'
+            self._parts.append(
+                '--%s\r\nContent-Disposition: form-data; name="%s"; '
+                'filename="%s"\r\nContent-Type: %s\r\n\r\n' %
+                (self.boundary, name, filename, content_type))
+            self._parts.append(fp)
+            self._parts.append('\r\n')
+        self._parts.append('--%s--\r\n' % self.boundary)
+        self._length = sum(len(p) if isinstance(p, str) else _file_size(p)
+                           for p in self._parts)
+        # where the files start, for rewind()
+        self._start = [(fp, fp.tell()) for name, fp in files]
+        self._all_parts = list(self._parts)
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary=%s' % self.boundary
+
+    def __len__(self):
+        return self._length
+
+    def rewind(self):
+        """start the stream over, e.g. to send the request again
+
+        Raises:
+            IOError: If a file is not seekable.
+        """
+        for fp, position in self._start:
+            fp.seek(position)
+        self._parts = list(self._all_parts)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length
+        chunks = []
+        while size > 0 and self._parts:
+            part = self._parts[0]
+            if isinstance(part, str):
+                chunk, rest = part[:size], part[size:]
+                if rest:
+                    self._parts[0] = rest
+                else:
+                    self._parts.pop(0)
+            else:
+                chunk = part.read(size)
+                if not chunk:
+                    self._parts.pop(0)
+                    continue
+            chunks.append(chunk)
+            size -= len(chunk)
+        return ''.join(chunks)
+
+
+def _byte_ranges(length, parts):
+    """split length bytes into (first, last) ranges of about equal size"""
+    part_size = -(-length // parts)
+    return [(first, min(first + part_size, length) - 1)
+            for first in xrange(0, length, part_size)]
+
+
+def download(session, url, fp, parallel=1, chunk_size=CHUNK_SIZE):
+    """Stream the content of url into the file object fp.
+
+    With parallel > 1, and if the server supports byte ranges, the file
+    is fetched in that many parts concurrently.  fp must then be
+    seekable, e.g. a file opened with 'wb'.
+
+    Returns:
+        The number of bytes written.
+    """
+    if parallel > 1:
+        head = session.request('HEAD', url, erc=200)
+        length = int(head.headers.get('Content-Length') or 0)
+        if head.headers.get('Accept-Ranges') == 'bytes' and \
+                length >= MIN_PART_SIZE:
+            return _download_parts(session, url, fp, length, parallel,
+                                   chunk_size)
+
+    response = session.request('GET', url, erc=200, stream=True)
+    count = 0
+    try:
+        for chunk in response.iter_content(chunk_size):
+            fp.write(chunk)
+            count += len(chunk)
+    finally:
+        response.close()
+    return count
+
+
+def _download_parts(session, url, fp, length, parallel, chunk_size):
+    lock = threading.Lock()
+    start = fp.tell()
+
+    def fetch(byte_range):
+        first, last = byte_range
+        response = session.request(
+            'GET', url, erc=206, stream=True,
+            headers={'Range': 'bytes=%d-%d' % (first, last)})
+        offset = start + first
+        try:
+            for chunk in response.iter_content(chunk_size):
+                with lock:
+                    fp.seek(offset)
+                    fp.write(chunk)
+                offset += len(chunk)
+        finally:
+            response.close()
+        return offset - start - first
+
+    count = sum(n for _, n in bounded_imap(
+        fetch, _byte_ranges(length, parallel), parallel, ordered=False))
+    fp.seek(start + count)
+    return count
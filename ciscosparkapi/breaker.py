@@ -0,0 +1,176 @@
+"""Per-endpoint circuit breakers, to fail fast during Spark outages.
+
+A circuit breaker watches the calls to one endpoint (e.g. 'GET rooms').
+While it is 'closed' all calls go through.  When too many recent calls
+failed (5xx, connection errors, timeouts) or were too slow, it 'opens'
+and calls fail fast with SparkCircuitOpenError.  After open_time
+seconds it is 'half-open': a limited number of probe calls go through,
+if they succeed it closes again, if one fails it opens again.
+"""
+
+
+import time
+import threading
+from collections import deque, OrderedDict
+from ciscosparkapi.exceptions import SparkCircuitOpenError
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# maximum number of GET results kept for serving stale values
+_STALE_ENTRIES = 1000
+
+
+class CircuitBreaker(object):
+    """Circuit breaker for one endpoint.
+
+    Args:
+        error_rate (float): failed share of the calls in the window
+            which opens the circuit
+        min_calls (int): minimum number of calls in the window before
+            the circuit can open
+        window (float): seconds of call history to consider
+        slow_call (float): calls taking longer (seconds) count as failed
+        open_time (float): seconds to fail fast before probing
+        probes (int): number of concurrent probe calls when half-open,
+            and the number of successful probes needed to close
+    """
+
+    def __init__(self, error_rate=0.5, min_calls=10, window=30.0,
+                 slow_call=10.0, open_time=30.0, probes=1):
+        super(CircuitBreaker, self).__init__()
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.slow_call = slow_call
+        self.open_time = open_time
+        self.probes = probes
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._calls = deque()
+        self._failures = 0
+        self._opened_at = 0
+        self._probing = 0
+        self._probe_successes = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and \
+                    time.time() >= self._opened_at + self.open_time:
+                return HALF_OPEN
+            return self._state
+
+    @property
+    def retry_at(self):
+        """when the next probe is allowed (epoch seconds)"""
+        return self._opened_at + self.open_time
+
+    def allow(self):
+        """may a call go through now?"""
+        with self._lock:
+            if self._state == OPEN:
+                if time.time() < self._opened_at + self.open_time:
+                    return False
+                self._state = HALF_OPEN
+                self._probing = 0
+                self._probe_successes = 0
+            if self._state == HALF_OPEN:
+                if self._probing >= self.probes:
+                    return False
+                self._probing += 1
+            return True
+
+    def release(self):
+        """give back the slot of a call which was allowed but not made"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probing > 0:
+                self._probing -= 1
+
+    def record(self, success, elapsed):
+        """record the outcome of a call which was allowed"""
+        failure = not success or elapsed > self.slow_call
+        now = time.time()
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probing -= 1
+                if failure:
+                    self._open(now)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.probes:
+                        self._state = CLOSED
+                        self._calls.clear()
+                        self._failures = 0
+                return
+            self._calls.append((now, failure))
+            self._failures += failure
+            while self._calls and self._calls[0][0] < now - self.window:
+                self._failures -= self._calls.popleft()[1]
+            if self._state == CLOSED and \
+                    len(self._calls) >= self.min_calls and \
+                    self._failures >= self.error_rate * len(self._calls):
+                self._open(now)
+
+    def _open(self, now):
+        self._state = OPEN
+        self._opened_at = now
+
+
+class CircuitBreakers(object):
+    """The circuit breakers of a RestSession, one per endpoint.
+
+    Args:
+        serve_stale (bool): when a GET fails fast, return the last good
+            result of the same GET instead, if there is one
+        **settings: CircuitBreaker arguments for all endpoints
+    """
+
+    def __init__(self, serve_stale=False, **settings):
+        super(CircuitBreakers, self).__init__()
+        self.serve_stale = serve_stale
+        self._settings = settings
+        self._lock = threading.Lock()
+        self._breakers = {}
+        self._stale = OrderedDict()
+
+    def __getitem__(self, endpoint):
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = \
+                    CircuitBreaker(**self._settings)
+            return breaker
+
+    def states(self):
+        """dict of the endpoints and the states of their breakers"""
+        with self._lock:
+            breakers = self._breakers.items()
+        return dict((endpoint, b.state) for endpoint, b in breakers)
+
+    def check(self, endpoint):
+        """return the breaker of endpoint if a call may go through
+
+        Raises:
+            SparkCircuitOpenError: If the circuit is open.
+        """
+        breaker = self[endpoint]
+        if not breaker.allow():
+            raise SparkCircuitOpenError(endpoint, breaker.retry_at)
+        return breaker
+
+    def remember(self, key, response, result):
+        """keep the result of a successful (200) GET for serving it stale"""
+        if self.serve_stale and response.status_code == 200:
+            with self._lock:
+                self._stale.pop(key, None)
+                self._stale[key] = (response, result)
+                if len(self._stale) > _STALE_ENTRIES:
+                    self._stale.popitem(last=False)
+
+    def stale(self, key):
+        """the last good (response, result) of a GET, or None"""
+        with self._lock:
+            return self._stale.get(key)
@@ -0,0 +1,171 @@
+"""Caches used by the API wrappers."""
+
+
+import time
+import weakref
+import threading
+
+
+class NegativeCache(object):
+    """Remembers for a short time which IDs were not found (404).
+
+    A ttl of 0 disables the cache: nothing is remembered.
+
+    Args:
+        ttl (float): seconds a not-found entry is remembered
+    """
+
+    def __init__(self, ttl=0):
+        super(NegativeCache, self).__init__()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._expires = {}
+        self._hits = 0
+        self._misses = 0
+
+    def __contains__(self, key):
+        """is key known to be not found? (counted as hit or miss)"""
+        now = time.time()
+        with self._lock:
+            expires = self._expires.get(key)
+            if expires is not None and expires <= now:
+                del self._expires[key]
+                expires = None
+            if expires is None:
+                self._misses += 1
+                return False
+            self._hits += 1
+            return True
+
+    def __len__(self):
+        return len(self._expires)
+
+    def add(self, key):
+        """remember key as not found"""
+        if self.ttl > 0:
+            with self._lock:
+                self._expires[key] = time.time() + self.ttl
+
+    def discard(self, key):
+        """forget key, e.g. because it was just created"""
+        with self._lock:
+            self._expires.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._expires.clear()
+
+    @property
+    def stats(self):
+        """hits, misses and size of the cache"""
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses,
+                    'size': len(self._expires)}
+
+
+# maximum number of strings in the table of an IdentityMap
+MAX_STRINGS = 100000
+
+
+def _interned_key(key):
+    """are the values of key references to other objects (IDs or emails),
+    repeated across objects and worth interning?
+
+    The object's own 'id' is unique, interning it would only grow the
+    table.
+    """
+    return key.endswith('Id') or key.endswith('Email') or \
+        key in ('email', 'emails', 'mentionedPeople')
+
+
+class IdentityMap(object):
+    """Resolves each object ID to one Spark object instance.
+
+    Objects are held by weak references: an object is dropped from the
+    map once nobody else uses it.  The IDs and emails of referenced
+    objects are interned in a table of the map, so repeated references
+    (e.g. the roomId of all messages of a room) share one string.  The
+    table is emptied when it reaches max_strings, strings already shared
+    stay shared.
+
+    Args:
+        max_strings (int): maximum number of strings in the table
+    """
+
+    def __init__(self, max_strings=MAX_STRINGS):
+        super(IdentityMap, self).__init__()
+        self.max_strings = max_strings
+        self._lock = threading.Lock()
+        self._objects = {}
+        # unicode strings cannot be intern()ed, hence the own table
+        self._strings = {}
+
+    def _intern(self, value):
+        # called with the lock held
+        interned = self._strings.get(value)
+        if interned is None:
+            if len(self._strings) >= self.max_strings:
+                self._strings.clear()
+            interned = self._strings[value] = value
+        return interned
+
+    def intern(self, value):
+        """the shared copy of a string"""
+        with self._lock:
+            return self._intern(value)
+
+    def _intern_data(self, data):
+        interned = {}
+        with self._lock:
+            for key, value in data.iteritems():
+                if _interned_key(key):
+                    if isinstance(value, basestring):
+                        value = self._intern(value)
+                    elif isinstance(value, list):
+                        value = [self._intern(v)
+                                 if isinstance(v, basestring) else v
+                                 for v in value]
+                interned[key] = value
+        return interned
+
+    def get(self, cls, data):
+        """the cls object with the id of data, updated from data
+
+        Args:
+            cls (class): the Spark object class
+            data (dict): the JSON data of the object
+
+        Returns:
+            The same cls instance for the same id (while it is in use).
+        """
+        data = self._intern_data(data)
+        objId = data.get('id')
+        if objId is None:
+            return cls(data)
+        with self._lock:
+            objects = self._objects.get(cls)
+            if objects is None:
+                objects = self._objects[cls] = weakref.WeakValueDictionary()
+            obj = objects.get(objId)
+            if obj is None:
+                obj = objects[objId] = cls(data)
+                return obj
+        obj.__copy__(data)
+        return obj
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(objects) for objects in self._objects.values())
+
+    def clear(self):
+        with self._lock:
+            self._objects.clear()
+            self._strings.clear()
+
+    @property
+    def stats(self):
+        """number of mapped objects and interned strings"""
+        with self._lock:
+            return {'objects': sum(len(objects)
+                                   for objects in self._objects.values()),
+                    'strings': len(self._strings)}
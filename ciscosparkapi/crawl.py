@@ -0,0 +1,102 @@
+"""Crawl the message histories of many rooms with a pool of processes.
+
+The rooms are split across worker processes, each with its own
+CiscoSparkAPI session, so fetching, JSON decoding and building the
+Message objects use all cores.  To stay within the rate limit of the
+token, give all workers one SharedRateBudget:
+
+    budget = SharedRateBudget('/tmp/spark-budget', rate=5)
+    for room, messages in crawl(token, rate_budget=budget):
+        ...
+
+or write the history of each room into a JSON Lines file instead of
+sending the messages back to the parent process:
+
+    for room, count in crawl(token, output_dir='history'):
+        ...
+"""
+
+
+import os
+import urllib
+import multiprocessing
+from ciscosparkapi import CiscoSparkAPI
+from ciscosparkapi.api.rooms import Room
+from ciscosparkapi.api.sparkobject import dumps_many
+
+
+# the CiscoSparkAPI of a worker process
+_api = None
+
+
+def _init_worker(access_token, rate_budget, kwargs):
+    global _api
+    _api = CiscoSparkAPI(access_token, rate_budget=rate_budget, **kwargs)
+
+
+def room_file(output_dir, roomId):
+    """the JSON Lines file of the messages of a room"""
+    return os.path.join(output_dir, urllib.quote(roomId, safe='') + '.jsonl')
+
+
+def _tasks(rooms, output_dir):
+    for room in rooms:
+        assert isinstance(room, Room)
+        yield room, output_dir
+
+
+def _crawl_room(args):
+    room, output_dir = args
+    messages = _api.messages.list(room)
+    if output_dir is None:
+        return room, list(messages)
+    path = room_file(output_dir, room.id)
+    with open(path + '.part', 'wb') as fp:
+        count = dumps_many(messages, fp)
+    # only complete files get the final name
+    os.rename(path + '.part', path)
+    return room, count
+
+
+def crawl(access_token, rooms=None, processes=None, rate_budget=None,
+          output_dir=None, **kwargs):
+    """Fetch the messages of many rooms in parallel worker processes.
+
+    Args:
+        access_token (string): the Spark access token
+        rooms (iterable): the rooms (Room objects) to crawl, defaults to
+            all rooms visible to the token
+        processes (int): number of worker processes, defaults to the
+            number of cores
+        rate_budget (SharedRateBudget): rate budget shared by all
+            workers; a RateBudget would be copied into each worker
+        output_dir (string): write the messages of each room into a
+            JSON Lines file (see room_file()) in this directory
+        **kwargs: further CiscoSparkAPI arguments for the workers
+
+    Returns:
+        An iterator of (room, messages) tuples in the order the rooms
+        are completed, messages is a list of Message objects, or the
+        number of messages written with output_dir.
+
+    Raises:
+        SparkApiError: If a request of a worker fails (the error comes
+            without its request and response objects).
+    """
+    if rooms is None:
+        api = CiscoSparkAPI(access_token, rate_budget=rate_budget, **kwargs)
+        rooms = api.rooms.list()
+    if output_dir is not None and not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    pool = multiprocessing.Pool(processes, _init_worker,
+                                (access_token, rate_budget, kwargs))
+    try:
+        tasks = _tasks(rooms, output_dir)
+        for result in pool.imap_unordered(_crawl_room, tasks):
+            yield result
+        pool.close()
+    finally:
+        # stops the workers if the iteration is abandoned or failed
+        pool.terminate()
+        pool.join()
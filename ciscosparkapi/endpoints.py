@@ -0,0 +1,127 @@
+"""Spark API endpoint descriptors, built once at import time.
+
+An Endpoint describes one API request: its method, path, the names of
+its body (POST, PUT) or query (GET, DELETE) fields and the expected
+response codes.  The API wrappers pass Endpoints to the RestSession
+instead of lists of attribute names, so nothing of that is rebuilt or
+checked per call.  Field names are validated when an Endpoint is
+created, so a misspelled name fails at import time.
+"""
+
+
+import re
+
+
+# Cisco Spark cloud Expected Response Codes (HTTP Response Codes)
+ERC = {
+    'HEAD': 200,
+    'GET': 200,
+    'POST': 200,
+    'PUT': 200,
+    'DELETE': 204
+}
+
+# Spark API responds with:
+# Response Code [429] - The number of allowed requests is exceeded.
+# Please try your request later
+_API_THROTTLE_STATUS_CODE = 429
+
+_FIELD_NAME = re.compile(r'^[A-Za-z][A-Za-z0-9]*$')
+
+
+def expected_codes(erc):
+    """the expected response codes as a tuple, without 429 (throttling)
+
+    Args:
+        erc (int or list): the expected response code(s)
+    """
+    if isinstance(erc, int):
+        erc = (erc,)
+    elif not isinstance(erc, (list, tuple)):
+        raise TypeError('unexpected response code type <%r>' % erc)
+    return tuple(code for code in erc if code != _API_THROTTLE_STATUS_CODE)
+
+
+class Endpoint(object):
+    """A precompiled API request.
+
+    Args:
+        name (string): e.g. 'rooms.list'
+        method (string): the HTTP method
+        path (string): the path of the collection, relative to base_url
+        fields (list): names of the body (POST, PUT) or query (GET,
+            DELETE) fields
+        erc (int or list): expected response code(s), defaults to ERC
+
+    Raises:
+        ValueError: If a field name is not a valid attribute name.
+    """
+
+    __slots__ = ('name', 'method', 'path', 'fields', 'erc', 'target')
+
+    def __init__(self, name, method, path, fields=(), erc=None):
+        super(Endpoint, self).__init__()
+        assert method in ERC
+        for field in fields:
+            if not _FIELD_NAME.match(field):
+                raise ValueError('invalid field name %r in endpoint %s' %
+                                 (field, name))
+        self.name = name
+        self.method = method
+        self.path = path
+        self.fields = frozenset(fields)
+        self.erc = expected_codes(ERC[method] if erc is None else erc)
+        # where the fields go in the request
+        self.target = 'json' if method in ('POST', 'PUT') else 'params'
+
+    def __contains__(self, field):
+        return field in self.fields
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __repr__(self):
+        return '<Endpoint %s: %s %s>' % (self.name, self.method, self.path)
+
+    def url(self, objId=None):
+        """the path of the collection, or of the object with objId"""
+        if objId is None:
+            return self.path
+        return '/'.join((self.path, objId))
+
+
+# all endpoints, by name
+ENDPOINTS = {}
+
+
+def _register(name, method, path, fields=(), erc=None):
+    ENDPOINTS[name] = Endpoint(name, method, path, fields, erc)
+
+
+_register('rooms.list', 'GET', 'rooms', ['teamId', 'max', 'type', 'sortBy'])
+_register('rooms.create', 'POST', 'rooms', ['title', 'teamId'])
+_register('rooms.details', 'GET', 'rooms')
+_register('rooms.update', 'PUT', 'rooms', ['title'])
+_register('rooms.delete', 'DELETE', 'rooms')
+
+# 'beforeMessage' is converted to 'before' by MessagesAPI.list
+_register('messages.list', 'GET', 'messages',
+          ['roomId', 'before', 'beforeMessage', 'max'])
+_register('messages.create', 'POST', 'messages',
+          ['roomId', 'toPersonId', 'toPersonEmail', 'text', 'markdown',
+           'html', 'files'])
+_register('messages.details', 'GET', 'messages')
+_register('messages.delete', 'DELETE', 'messages')
+
+_register('memberships.list', 'GET', 'memberships',
+          ['roomId', 'personId', 'personEmail', 'max'])
+# 409: the person is already a member
+_register('memberships.create', 'POST', 'memberships',
+          ['roomId', 'personId', 'personEmail', 'isModerator'],
+          erc=[200, 409])
+_register('memberships.details', 'GET', 'memberships', erc=[200, 404])
+_register('memberships.update', 'PUT', 'memberships', ['isModerator'])
+_register('memberships.delete', 'DELETE', 'memberships')
+
+_register('people.list', 'GET', 'people', ['email', 'displayName', 'max'])
+_register('people.details', 'GET', 'people', erc=[200, 404])
@@ -1,6 +1,24 @@
 """ciscosparkapi exception classes."""
 
 
+def _message(response):
+    """the error message of a response, also if its body is not JSON
+    (e.g. the HTML error page of a gateway)"""
+    if response is None:
+        return None
+    try:
+        data = response.json()
+    except ValueError:
+        text = getattr(response, 'text', None)
+        if text is None:
+            # the transports' responses have no 'text'
+            text = response.content
+        return text or None
+    if isinstance(data, dict):
+        return data.get('message')
+    return None
+
+
 class ciscosparkapiException(Exception):
     """Base class for all ciscosparkapi package exceptions."""
 
@@ -17,7 +35,26 @@ class SparkApiError(ciscosparkapiException):
         self.request = request
         self.response = response
 
-        self.response_text = response.json().get('message')
+        self.response_text = _message(response)
         error_message = "Response Code [%s] - %s" % \
                         (response_code, self.response_text)
         super(SparkApiError, self).__init__(error_message)
+
+    def __reduce__(self):
+        # pickled (e.g. from a worker process) without the request and
+        # response objects, which do not pickle
+        return (self.__class__, (self.response_code,),
+                {'args': self.args, 'response_text': self.response_text})
+
+
+class SparkCircuitOpenError(ciscosparkapiException):
+    """Calls to an endpoint fail fast, its circuit breaker is open."""
+
+    def __init__(self, endpoint, retry_at):
+        self.endpoint = endpoint
+        self.retry_at = retry_at
+        error_message = "Circuit open for [%s] - failing fast" % endpoint
+        super(SparkCircuitOpenError, self).__init__(error_message)
+
+    def __reduce__(self):
+        return (self.__class__, (self.endpoint, self.retry_at))
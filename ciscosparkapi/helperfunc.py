@@ -1,7 +1,12 @@
 """Package helper functions."""
 
+import sys
+import threading
 from datetime import datetime
-from dateutil import parser
+
+
+# default number of concurrent requests for the bulk operations
+DEFAULT_WORKERS = 8
 
 
 def utf8(string):
@@ -19,7 +24,8 @@ def sparkISO8601(dt):
         note that all timestamps are assumed to be UTC
     """
     assert isinstance(dt, datetime)
-    return utf8(dt.strftime('%Y-%m-%dT%H:%M:%S.000Z'))
+    return utf8('%s.%03dZ' % (dt.strftime('%Y-%m-%dT%H:%M:%S'),
+                              dt.microsecond // 1000))
 
 
 def sparkParseTime(string):
@@ -29,4 +35,83 @@ def sparkParseTime(string):
         Returns:
             datetime.datetime object
     """
+    # fast path for the format used by Spark: 2016-07-28T13:14:35.000Z
+    if len(string) == 24 and string[10] == 'T' and string[23] == 'Z':
+        try:
+            return datetime(int(string[0:4]), int(string[5:7]),
+                            int(string[8:10]), int(string[11:13]),
+                            int(string[14:16]), int(string[17:19]),
+                            int(string[20:23]) * 1000)
+        except ValueError:
+            pass
+    # dateutil is only imported when it is actually needed
+    from dateutil import parser
     return parser.parse(string).replace(tzinfo=None)
+
+
+def bounded_imap(fn, iterable, max_workers=DEFAULT_WORKERS, ordered=True):
+    """Apply fn to all items of iterable using up to max_workers threads.
+
+    At most max_workers calls of fn are in flight at any time.
+
+    Args:
+        fn (callable): called with each item
+        iterable: the input items
+        max_workers (int): maximum number of concurrent calls
+        ordered (bool): yield in input order, otherwise as completed
+
+    Returns:
+        An iterator of (item, result) tuples.
+
+    Raises:
+        The first exception raised by fn, in the calling thread.
+    """
+    # not imported at module level, to keep 'import ciscosparkapi' cheap
+    import Queue
+    assert max_workers > 0
+    source = enumerate(iterable)
+    lock = threading.Lock()
+    stop = threading.Event()
+    results = Queue.Queue()
+
+    def worker():
+        while not stop.is_set():
+            with lock:
+                try:
+                    index, item = next(source)
+                except StopIteration:
+                    break
+            try:
+                results.put((index, item, fn(item), None))
+            except Exception:
+                results.put((index, item, None, sys.exc_info()))
+        # tell the consumer this worker is done
+        results.put(None)
+
+    running = max_workers
+    for i in range(max_workers):
+        t = threading.Thread(target=worker)
+        t.daemon = True
+        t.start()
+
+    pending = {}
+    next_index = 0
+    try:
+        while running:
+            entry = results.get()
+            if entry is None:
+                running -= 1
+                continue
+            index, item, result, exc_info = entry
+            if exc_info is not None:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            if not ordered:
+                yield item, result
+                continue
+            pending[index] = (item, result)
+            while next_index in pending:
+                yield pending.pop(next_index)
+                next_index += 1
+    finally:
+        # also stops the workers if the consumer bails out early
+        stop.set()
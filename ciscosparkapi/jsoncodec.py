@@ -0,0 +1,65 @@
+"""JSON codecs used for request/response bodies and Spark objects.
+
+The default is the stdlib 'json' module. A faster JSON library can be
+used if it is installed:
+
+    get_codec('ujson')      ujson, raises ImportError if not installed
+    get_codec('fastest')    the fastest installed library, falling
+                            back to the stdlib
+
+Note that some libraries (e.g. ujson) do not keep the key order of an
+OrderedDict, so SparkBaseObject.dumps() may order the keys differently.
+"""
+
+
+import json
+import importlib
+
+
+# fastest first
+_FAST_LIBRARIES = ('ujson', 'simplejson', 'json')
+
+
+class JSONCodec(object):
+    """A JSON library, providing loads() and dumps()."""
+
+    def __init__(self, module):
+        super(JSONCodec, self).__init__()
+        self.name = module.__name__
+        self.loads = module.loads
+        self.dumps = module.dumps
+
+    def __repr__(self):
+        return '<JSONCodec %s>' % self.name
+
+
+# the stdlib codec
+DEFAULT_CODEC = JSONCodec(json)
+
+_codecs = {'json': DEFAULT_CODEC}
+
+
+def get_codec(codec=None):
+    """Return the JSONCodec for a library name.
+
+    Args:
+        codec (string or JSONCodec): a library name ('json', 'simplejson',
+            'ujson'), 'fastest' for the fastest installed library, or a
+            JSONCodec which is returned as is. None is the stdlib codec.
+
+    Raises:
+        ImportError: If the library is not installed.
+    """
+    if codec is None:
+        return DEFAULT_CODEC
+    if isinstance(codec, JSONCodec):
+        return codec
+    if codec == 'fastest':
+        for name in _FAST_LIBRARIES:
+            try:
+                return get_codec(name)
+            except ImportError:
+                pass
+    if codec not in _codecs:
+        _codecs[codec] = JSONCodec(importlib.import_module(codec))
+    return _codecs[codec]
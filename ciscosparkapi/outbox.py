@@ -0,0 +1,232 @@
+"""Durable write-behind outbox for sending messages.
+
+Messages put into the outbox are stored in a SQLite file and sent by
+background threads.  The messages of one conversation (room, or person
+for 1:1 messages) are sent one at a time in the order they were put,
+different conversations are sent concurrently.  Failed sends are
+retried with exponential backoff, as long as the failure is temporary
+(throttling, 5xx, connection errors, open circuits); any other error
+gives the message up at once.
+
+Messages still in the file when the process ends are sent once an
+outbox is opened on the same file again.  A message which was being
+sent when the process died is sent again, so delivery is at least once.
+"""
+
+
+import sys
+import json
+import time
+import socket
+import sqlite3
+import httplib
+import threading
+import traceback
+from ciscosparkapi.exceptions import SparkApiError, SparkCircuitOpenError
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation TEXT NOT NULL,
+    args TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_try REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS outbox_conversation ON outbox (conversation, id);
+'''
+
+# the first message of each conversation which is due
+_NEXT = '''
+SELECT id, conversation, args, attempts FROM outbox AS o
+WHERE next_try <= ? AND
+      id = (SELECT MIN(id) FROM outbox WHERE conversation = o.conversation)
+ORDER BY id
+'''
+
+# longest time an idle sender sleeps before looking at the file again
+_POLL = 1.0
+
+
+def _conversation(kwargs):
+    return kwargs.get('roomId') or kwargs.get('toPersonId') or \
+        kwargs.get('toPersonEmail')
+
+
+# errors of the transports' libraries worth retrying, by module; only
+# modules already imported (by the transport in use) are looked at
+_TRANSPORT_ERRORS = {
+    'requests.exceptions': ('ConnectionError', 'Timeout',
+                            'ChunkedEncodingError'),
+    'urllib3.exceptions': ('ProtocolError', 'TimeoutError', 'MaxRetryError',
+                           'EmptyPoolError'),
+}
+
+
+def _transport_errors():
+    errors = [socket.error, httplib.HTTPException, SparkCircuitOpenError]
+    for module, names in _TRANSPORT_ERRORS.items():
+        module = sys.modules.get(module)
+        if module is not None:
+            errors.extend(getattr(module, name) for name in names)
+    return tuple(errors)
+
+
+def _temporary(error):
+    """is error worth retrying? (throttling, 5xx, connection errors and
+    open circuits)"""
+    if isinstance(error, SparkApiError):
+        return error.response_code == 429 or error.response_code >= 500
+    return isinstance(error, _transport_errors())
+
+
+class Outbox(object):
+    """Sends messages in the background from a SQLite file.
+
+    Args:
+        send (callable): sends one message, called with the message's
+            keyword arguments
+        path (string): the SQLite file, created if it does not exist
+        workers (int): number of sender threads
+        max_attempts (int): attempts before a message is given up
+        backoff (float): seconds before the first retry, doubled for
+            every further retry
+        callback (callable): called as callback(id, result, error) in a
+            sender thread when a message was sent (error is None) or
+            was given up (result is None); it is then removed from the
+            file
+    """
+
+    def __init__(self, send, path, workers=4, max_attempts=8, backoff=1.0,
+                 callback=None):
+        super(Outbox, self).__init__()
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.callback = callback
+        self._send = send
+        self._db = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(_SCHEMA)
+        # guards the database and the set of busy conversations
+        self._cond = threading.Condition()
+        self._busy = set()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._run,
+                                          name='outbox-%d' % i)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def put(self, kwargs):
+        """store a message for sending
+
+        Args:
+            kwargs (dict): the keyword arguments of the message, one of
+                roomId, toPersonId or toPersonEmail is required
+
+        Returns:
+            The id of the message in the outbox.
+        """
+        conversation = _conversation(kwargs)
+        assert conversation
+        args = json.dumps(kwargs)
+        with self._cond:
+            assert not self._closed
+            cursor = self._db.execute(
+                'INSERT INTO outbox (conversation, args) VALUES (?, ?)',
+                (conversation, args))
+            self._cond.notify()
+            return cursor.lastrowid
+
+    def __len__(self):
+        """number of messages not sent yet"""
+        with self._cond:
+            return self._db.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    def flush(self, timeout=None):
+        """wait until all messages are sent or given up, and reported
+
+        Returns:
+            True if the outbox is empty, False on timeout.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self._busy or \
+                    self._db.execute('SELECT 1 FROM outbox LIMIT 1').fetchone():
+                wait = _POLL
+                if deadline is not None:
+                    wait = min(wait, deadline - time.time())
+                    if wait <= 0:
+                        return False
+                self._cond.wait(wait)
+            return True
+
+    def close(self, wait=True):
+        """stop the sender threads, the unsent messages stay in the file
+
+        Args:
+            wait (bool): wait for the messages being sent right now
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+            self._db.close()
+
+    def _take(self):
+        """the next message which may be sent now, or None when closed"""
+        with self._cond:
+            while not self._closed:
+                now = time.time()
+                for row in self._db.execute(_NEXT, (now,)).fetchall():
+                    if row[1] not in self._busy:
+                        self._busy.add(row[1])
+                        return row
+                next_try = self._db.execute(
+                    'SELECT MIN(next_try) FROM outbox').fetchone()[0]
+                wait = _POLL
+                if next_try is not None and next_try > now:
+                    wait = min(wait, next_try - now)
+                self._cond.wait(wait)
+
+    def _run(self):
+        while True:
+            row = self._take()
+            if row is None:
+                return
+            id, conversation, args, attempts = row
+            result = error = None
+            try:
+                result = self._send(**json.loads(args))
+            except Exception as e:
+                error = e
+            attempts += 1
+            with self._cond:
+                if error is not None and _temporary(error) and \
+                        attempts < self.max_attempts:
+                    self._db.execute(
+                        'UPDATE outbox SET attempts = ?, next_try = ? '
+                        'WHERE id = ?',
+                        (attempts,
+                         time.time() + self.backoff * 2 ** (attempts - 1),
+                         id))
+                    done = False
+                else:
+                    self._db.execute('DELETE FROM outbox WHERE id = ?', (id,))
+                    done = True
+            # the conversation stays busy until the callback returned, so
+            # the callbacks of a conversation are called in order, too
+            if done and self.callback is not None:
+                try:
+                    self.callback(id, result, error)
+                except Exception:
+                    # a failing callback must not stop the sender
+                    traceback.print_exc(file=sys.stderr)
+            with self._cond:
+                self._busy.discard(conversation)
+                self._cond.notify_all()
@@ -0,0 +1,113 @@
+"""Opt-in timing of the phases of API calls, and profiling hooks.
+
+Inside a profile() block the time spent in each phase of the API calls
+is added up, per phase and per endpoint (e.g. 'GET messages'):
+
+    args        processing and encoding the arguments
+    wait        waiting for the rate budget
+    network     sending the request and receiving the response
+    json        decoding the JSON response
+    objects     creating the Spark objects, including parse_time
+    parse_time  parsing the timestamps of the Spark objects
+
+    with profile() as times:
+        for message in api.messages.list(room):
+            pass
+
+prints a report at the end of the block.  Outside of profile() blocks
+nothing is timed.
+"""
+
+
+import sys
+import threading
+from contextlib import contextmanager
+
+
+PHASES = ('args', 'wait', 'network', 'json', 'objects', 'parse_time')
+
+# the PhaseTimes of the active profile() blocks
+active = []
+
+# per thread: the endpoint of the last request
+_local = threading.local()
+
+
+def set_endpoint(endpoint):
+    """attribute the following phases of this thread to endpoint"""
+    _local.endpoint = endpoint
+
+
+def record(phase, seconds):
+    """add seconds to phase in all active profile() blocks"""
+    endpoint = getattr(_local, 'endpoint', None)
+    for times in list(active):
+        times.add(phase, seconds, endpoint)
+
+
+class PhaseTimes(object):
+    """Cumulative number of calls and seconds per phase and endpoint."""
+
+    def __init__(self):
+        super(PhaseTimes, self).__init__()
+        self._lock = threading.Lock()
+        self.phases = dict((phase, [0, 0.0]) for phase in PHASES)
+        self.endpoints = {}
+
+    def add(self, phase, seconds, endpoint=None):
+        with self._lock:
+            total = self.phases[phase]
+            total[0] += 1
+            total[1] += seconds
+            if endpoint is not None:
+                phases = self.endpoints.setdefault(endpoint, {})
+                total = phases.setdefault(phase, [0, 0.0])
+                total[0] += 1
+                total[1] += seconds
+
+    def report(self, fp=None):
+        """write a table of the times per phase and per endpoint"""
+        fp = fp or sys.stdout
+        line = '%-24s %-12s %8s %10s\n'
+        fp.write(line % ('endpoint', 'phase', 'count', 'seconds'))
+        rows = [('(all)', self.phases)] + sorted(self.endpoints.items())
+        for endpoint, phases in rows:
+            for phase in PHASES:
+                count, seconds = phases.get(phase, (0, 0.0))
+                if count:
+                    fp.write(line % (endpoint, phase, count,
+                                     '%.4f' % seconds))
+
+
+@contextmanager
+def profile(report=True, fp=None, stats_file=None):
+    """Time the phases of the API calls made in a block.
+
+    The calls of all threads are timed.
+
+    Args:
+        report (bool): write the report at the end of the block
+        fp (file): where to write the report, defaults to stdout
+        stats_file (string): also run cProfile (on the calling thread)
+            and dump its statistics into this file, for use with pstats
+
+    Returns:
+        The PhaseTimes of the block.
+    """
+    times = PhaseTimes()
+    profiler = None
+    if stats_file:
+        import cProfile
+        profiler = cProfile.Profile()
+    active.append(times)
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield times
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(stats_file)
+        active.remove(times)
+        if report:
+            times.report(fp)
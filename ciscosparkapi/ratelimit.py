@@ -0,0 +1,172 @@
+"""Rate budgets (token buckets) shared by sessions, threads and processes.
+
+A rate budget hands out one token per request at a sustained 'rate' per
+second with bursts of up to 'burst' requests.  On top of that it holds
+an embargo: after a 429 with Retry-After nobody gets a token until the
+embargo has passed.
+
+RateBudget is shared between the threads of a process.  SharedRateBudget
+keeps the same state in a memory-mapped file, guarded by flock(), so all
+processes on a host using the same file share one budget.  A forked
+child opens the file again, since an flock() belongs to the open file,
+which the child would otherwise share with its parent.
+"""
+
+
+import os
+import time
+import mmap
+import fcntl
+import struct
+import threading
+from contextlib import contextmanager
+
+
+# tokens, time of last refill, end of embargo
+_STATE = struct.Struct('<ddd')
+
+
+class RateBudget(object):
+    """Token bucket shared by the threads of a process.
+
+    Args:
+        rate (float): sustained requests per second
+        burst (int): maximum number of requests in a burst, defaults
+            to one second worth of requests
+    """
+
+    def __init__(self, rate, burst=None):
+        super(RateBudget, self).__init__()
+        assert rate > 0
+        self.rate = float(rate)
+        self.burst = float(burst or max(1, rate))
+        self._lock = threading.Lock()
+        self._state = [self.burst, time.time(), 0.0]
+
+    @contextmanager
+    def _locked(self):
+        """yield the mutable state list while holding the lock"""
+        with self._lock:
+            yield self._state
+
+    def reserve(self):
+        """take a token if one is available.
+
+        Returns:
+            0 if a token was taken, otherwise the number of seconds
+            until one might be available.
+        """
+        now = time.time()
+        with self._locked() as state:
+            tokens, stamp, embargo = state
+            if now < embargo:
+                return embargo - now
+            tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+            state[1] = now
+            if tokens >= 1:
+                state[0] = tokens - 1
+                return 0
+            state[0] = tokens
+            return (1 - tokens) / self.rate
+
+    def acquire(self, priority=None):
+        """block until a token is available and take it
+
+        priority is ignored, see ciscosparkapi.scheduler for a budget
+        with priority classes.
+        """
+        wait = self.reserve()
+        while wait:
+            time.sleep(wait)
+            wait = self.reserve()
+
+    def embargo(self, seconds):
+        """hand out no tokens for the given number of seconds"""
+        until = time.time() + seconds
+        with self._locked() as state:
+            if until > state[2]:
+                state[2] = until
+            # start from an empty bucket once the embargo ends, with no
+            # refill credited for the embargo itself
+            state[0] = 0.0
+            state[1] = max(state[1], state[2])
+
+    @property
+    def embargoed_until(self):
+        """end of the current embargo (epoch seconds), 0 if none"""
+        with self._locked() as state:
+            return state[2]
+
+
+class SharedRateBudget(RateBudget):
+    """Token bucket shared by all processes on a host using the same file.
+
+    All processes should use the same rate and burst.  Instances can be
+    pickled (e.g. passed to multiprocessing workers), the file is opened
+    again on unpickling.
+
+    Args:
+        path (string): the state file, created if it does not exist
+        rate (float): sustained requests per second for the whole host
+        burst (int): maximum number of requests in a burst
+    """
+
+    # guards reopening the file after a fork
+    _reopen_lock = threading.Lock()
+
+    def __init__(self, path, rate, burst=None):
+        super(SharedRateBudget, self).__init__(rate, burst)
+        self.path = path
+        self._open()
+
+    def _open(self):
+        self._pid = os.getpid()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < _STATE.size:
+                os.ftruncate(self._fd, _STATE.size)
+                os.write(self._fd, _STATE.pack(self.burst, time.time(), 0.0))
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, _STATE.size)
+
+    def _after_fork(self):
+        """open the file again if this process is a fork of its opener"""
+        with self._reopen_lock:
+            if self._pid == os.getpid():
+                return
+            # the inherited locks may have been held by other threads of
+            # the parent; closing the inherited descriptor does not
+            # release the parent's flock(), which it still shares
+            self._lock = threading.Lock()
+            self._map.close()
+            os.close(self._fd)
+            self._open()
+
+    @contextmanager
+    def _locked(self):
+        if self._pid != os.getpid():
+            self._after_fork()
+        # flock() does not serialize the threads of one process, which
+        # share the file descriptor, hence the additional thread lock
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                state = list(_STATE.unpack_from(self._map))
+                yield state
+                _STATE.pack_into(self._map, 0, *state)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    def __getstate__(self):
+        return (self.path, self.rate, self.burst)
+
+    def __setstate__(self, state):
+        self.path, self.rate, self.burst = state
+        self._lock = threading.Lock()
+        self._open()
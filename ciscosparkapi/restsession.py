@@ -1,10 +1,17 @@
 """RestSession class for creating 'connections' to the Cisco Spark APIs."""
 
 
+import time
 import urlparse
-import requests
-from .exceptions import ciscosparkapiException, SparkApiError
-from copy import deepcopy
+import threading
+from contextlib import contextmanager
+from .exceptions import ciscosparkapiException, SparkApiError, \
+    SparkCircuitOpenError
+from .singleflight import SingleFlight
+from .jsoncodec import get_codec, DEFAULT_CODEC
+from .endpoints import ERC, Endpoint, expected_codes, \
+    _API_THROTTLE_STATUS_CODE
+from . import profiling
 from datetime import datetime
 from ciscosparkapi.helperfunc import sparkISO8601, utf8
 
@@ -12,23 +19,20 @@ from ciscosparkapi.helperfunc import sparkISO8601, utf8
 # Default api.ciscospark.com base URL
 DEFAULT_API_URL = 'https://api.ciscospark.com/v1/'
 
-# Cisco Spark cloud Expected Response Codes (HTTP Response Codes)
-ERC = {
-    'GET': 200,
-    'POST': 200,
-    'PUT': 200,
-    'DELETE': 204
-}
-
-# Spark API responds with:
-# Response Code [429] - The number of allowed requests is exceeded.
-# Please try your request later
-_API_THROTTLE_STATUS_CODE = 429
-
 # if API throttling occurs, how much time to wait by default?
 # given in the n-th Fibonacci number (9th = 34s)
 _DEFAULT_BACKOFF = 9
 
+# adaptive page size for list requests without an explicit 'max':
+# start with the largest page the API hands out and halve the page size
+# while a page takes longer than _PAGE_LATENCY_TARGET seconds or is
+# bigger than _PAGE_BYTES_TARGET bytes. Double it again (up to the
+# start size) while pages are well below both targets.
+_PAGE_SIZE_START = 1000
+_PAGE_SIZE_MIN = 50
+_PAGE_LATENCY_TARGET = 2.0
+_PAGE_BYTES_TARGET = 1024 * 1024
+
 
 def _del_url_query_part(url, qp):
     """ removes query part from url """
@@ -45,6 +49,20 @@ def _del_url_query_part(url, qp):
     return urlparse.urlunsplit(new_parts)
 
 
+def _set_url_query_part(url, qp, value):
+    """ sets (adds or replaces) a query part of url """
+    # urllib imports socket and ssl, only pay for it when paging
+    import urllib
+    parts = urlparse.urlsplit(url)
+    query = [(k, v) for (k, v) in urlparse.parse_qsl(parts.query)
+             if k != qp]
+    query.append((qp, value))
+    new_parts = list(parts)
+    new_parts[3] = urllib.urlencode(query)
+
+    return urlparse.urlunsplit(new_parts)
+
+
 def _validate_base_url(base_url):
     parsed_url = urlparse.urlparse(base_url)
     if parsed_url.scheme and parsed_url.netloc:
@@ -83,8 +101,52 @@ def _process_args(what, apiattr, args):
     return args
 
 
-def _extract_and_parse_json(response):
-    return response.json()
+# encoders of field values, by type
+_ENCODERS = {
+    str: utf8,
+    unicode: utf8,
+    datetime: sparkISO8601,
+}
+
+
+def _process_fields(endpoint, args):
+    """ the Endpoint version of _process_args: only the endpoint's fields
+        are encoded and moved into the 'json' or 'params' dict
+    """
+    data = dict()
+    for k in endpoint.fields.intersection(args):
+        v = args.pop(k)
+        encode = _ENCODERS.get(type(v))
+        data[k] = v if encode is None else encode(v)
+    if data:
+        args[endpoint.target] = data
+    return args
+
+
+def _extract_and_parse_json(response, codec=DEFAULT_CODEC):
+    # e.g. DELETE responds with 204 and no content at all
+    if not response.content:
+        return None
+    if profiling.active:
+        start = time.time()
+        data = codec.loads(response.content)
+        profiling.record('json', time.time() - start)
+        return data
+    return codec.loads(response.content)
+
+
+def _endpoint(what, url, base_url):
+    """ the endpoint of a request, e.g. 'GET rooms'"""
+    if url.startswith(base_url):
+        path = url[len(base_url):]
+    else:
+        path = urlparse.urlsplit(url).path
+    return '%s %s' % (what, path.lstrip('/').split('/', 1)[0].split('?')[0])
+
+
+def _request_key(what, url, kwargs):
+    """hashable key identifying a request by method, URL and arguments"""
+    return (what, url, tuple(sorted((k, repr(v)) for k, v in kwargs.items())))
 
 
 def _fib():
@@ -107,17 +169,124 @@ def fib(n):
     return i
 
 
+class _PageSizer(object):
+    """picks the 'max' page size from the latency and size of the last page"""
+
+    def __init__(self):
+        super(_PageSizer, self).__init__()
+        self.size = _PAGE_SIZE_START
+
+    def update(self, elapsed, nbytes):
+        if elapsed > _PAGE_LATENCY_TARGET or nbytes > _PAGE_BYTES_TARGET:
+            self.size = max(_PAGE_SIZE_MIN, self.size // 2)
+        elif elapsed < _PAGE_LATENCY_TARGET / 4 and \
+                nbytes < _PAGE_BYTES_TARGET / 4:
+            self.size = min(_PAGE_SIZE_START, self.size * 2)
+
+
+class ItemIterator(object):
+    """ Iterator over the items of a paginated list request.
+
+        'cursor' is a plain (JSON serializable) dict pointing at the next
+        item to be returned: the URL of a page and the index within that
+        page. RestSession.resume_items(cursor) continues the iteration
+        from there, e.g. in another process. The cursor is None before
+        the first page has been fetched and when all items have been
+        returned.
+    """
+
+    def __init__(self, responses, adaptive, skip=0, codec=DEFAULT_CODEC):
+        super(ItemIterator, self).__init__()
+        self._responses = responses
+        self._codec = codec
+        self._adaptive = adaptive
+        self._skip = skip
+        self._items = []
+        self._index = 0
+        self._page_url = None
+        self._next_url = None
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        while self._index >= len(self._items):
+            # raises StopIteration after the last page
+            response = next(self._responses)
+            json_page = _extract_and_parse_json(response, self._codec)
+            assert isinstance(json_page, dict)
+            # sometimes there's an empty list returned
+            # I guess this should not happen server side, but if there's
+            # a lengthy list then the last page can have zero elements
+            # and the 2nd to last page still has a 'next' link header
+            items = json_page.get(u'items', None)
+            if items is None:
+                error_message = "'items' object not found in JSON data: %r" \
+                                % json_page
+                raise ciscosparkapiException(error_message)
+            self._items = items
+            self._index = min(self._skip, len(items))
+            self._skip = 0
+            self._page_url = response.url
+            self._next_url = response.links.get('next', {}).get('url')
+        item = self._items[self._index]
+        self._index += 1
+        return item
+
+    @property
+    def cursor(self):
+        if self._page_url is None:
+            return None
+        if self._index < len(self._items):
+            url, index = self._page_url, self._index
+        elif self._next_url:
+            url, index = self._next_url, 0
+        else:
+            return None
+        return {'url': url, 'index': index, 'adaptive': self._adaptive}
+
+
 class RestSession(object):
+    """ A session to the Spark API, shared by all API wrappers.
+
+        A RestSession (and the CiscoSparkAPI using it) is thread-safe: one
+        instance and its connection pool can serve many threads.
+        - last_response is tracked per thread, it always is the response
+          to the last request made by the calling thread
+        - the rate limit backoff state and the counters in 'stats' are
+          shared by all threads and updated under a lock
+        - the request priority (see priority()) is set per thread
+        - the transport must be thread-safe, which all transports in
+          ciscosparkapi.transport are
+    """
 
-    def __init__(self, access_token, base_url=DEFAULT_API_URL, timeout=None):
+    def __init__(self, access_token, base_url=DEFAULT_API_URL, timeout=None,
+                 transport=None, coalesce=False, rate_budget=None,
+                 codec=None, circuit_breakers=None):
         super(RestSession, self).__init__()
         self._base_url = _validate_base_url(base_url)
         self._access_token = access_token
-        self._req_session = requests.session()
+        # the transport does the HTTP work, default is a requests session
+        if transport is None:
+            from .transport import RequestsTransport
+            transport = RequestsTransport()
+        self._transport = transport
+        # coalesce concurrent identical GET requests?
+        self._singleflight = SingleFlight() if coalesce else None
+        # optional RateBudget, possibly shared with other processes
+        self._rate_budget = rate_budget
+        # JSON codec for request and response bodies
+        self._codec = get_codec(codec)
+        # optional CircuitBreakers, see ciscosparkapi.breaker
+        self._breakers = circuit_breakers
         self._timeout = None
-        self._last_response = None
+        # per thread state (last_response and its network_time, priority)
+        self._local = threading.local()
+        # guards the rate limit state and the counters
+        self._lock = threading.Lock()
         self._ratelimit_callback = None
         self._ratelimit_step = _DEFAULT_BACKOFF
+        self._stats = {'requests': 0, 'throttled': 0, 'errors': 0}
         self.update_headers({'Authorization': 'Bearer ' + access_token,
                              'Content-type': 'application/json;charset=utf-8'})
         self.timeout = timeout
@@ -138,36 +307,94 @@ class RestSession(object):
               response the step is decreased until it reaches the _DEFAULT_BACKOFF step
 
             The 'sleep time' is reported to the callback (if configured).
+
+            With a rate budget configured, every attempt takes a token
+            from the budget first, and the sleep time of a 429 is put
+            on the budget as an embargo for everyone sharing it. A
+            PriorityScheduler budget hands out the tokens by the
+            current_priority of the calling thread.
+
+            With circuit breakers configured, calls to an endpoint whose
+            circuit is open fail fast with SparkCircuitOpenError. 5xx
+            responses, transport errors and slow calls count as failures.
+
+            A streamed body (e.g. a MultipartStream) is rewound before it
+            is sent again.
         """
 
 	#print url, kwargs
 
         done = False
+        retry = False
         while not done:
             done = True
-            r = self._req_session.request(method, url, **kwargs)
+            if retry and hasattr(kwargs.get('data'), 'rewind'):
+                kwargs['data'].rewind()
+            retry = True
+            if self._rate_budget is not None:
+                start = time.time()
+                self._rate_budget.acquire(self.current_priority)
+                if profiling.active:
+                    profiling.record('wait', time.time() - start)
+            # the breaker is checked last, a half-open breaker's probe
+            # slot is taken here and must be given back in any case
+            breaker = None
+            if self._breakers is not None:
+                breaker = self._breakers.check(
+                    _endpoint(method, url, self._base_url))
+            start = time.time()
+            try:
+                r = self._transport.request(method, url,
+                                            timeout=self._timeout, **kwargs)
+            except Exception:
+                if breaker is not None:
+                    breaker.record(False, time.time() - start)
+                raise
+            except BaseException:
+                # e.g. KeyboardInterrupt, no failure of the endpoint
+                if breaker is not None:
+                    breaker.release()
+                raise
+            network_time = time.time() - start
+            if profiling.active:
+                profiling.record('network', network_time)
+            if breaker is not None:
+                breaker.record(r.status_code < 500, network_time)
             # was rate limiting in effect?
             if r.status_code == _API_THROTTLE_STATUS_CODE:
                 # does the server respond with a rate-limit header?
                 retry_after = int(r.headers.get('Retry-After', 0))
-                if retry_after > 0:
-                    sleep_time = retry_after
-                    self._ratelimit_step = _DEFAULT_BACKOFF
-                else:
-                    sleep_time = fib(self._ratelimit_step)
+                with self._lock:
+                    self._stats['requests'] += 1
+                    self._stats['throttled'] += 1
+                    if retry_after > 0:
+                        sleep_time = retry_after
+                        self._ratelimit_step = _DEFAULT_BACKOFF
+                    else:
+                        sleep_time = fib(self._ratelimit_step)
+                    callback = self._ratelimit_callback
+                    if callback is not None:
+                        self._ratelimit_step += 1
+                if self._rate_budget is not None:
+                    self._rate_budget.embargo(sleep_time)
                 # has a callback been configured?
                 # if yes, call it and see if we should try again
-                if self._ratelimit_callback is not None:
-                    done = not self._ratelimit_callback(sleep_time)
-                    self._ratelimit_step += 1
+                if callback is not None:
+                    done = not callback(sleep_time)
             else:
-                # no throttling: reduce the backoff step, if above threshold
-                if self._ratelimit_step > _DEFAULT_BACKOFF:
-                    self._ratelimit_step -= 1
+                with self._lock:
+                    self._stats['requests'] += 1
+                    # no throttling: reduce the backoff step, if above
+                    # threshold
+                    if self._ratelimit_step > _DEFAULT_BACKOFF:
+                        self._ratelimit_step -= 1
 
         # check response code
-        self._last_response = deepcopy(r)
+        self._local.last_response = r
+        self._local.network_time = network_time
         if not r.status_code in erc:
+            with self._lock:
+                self._stats['errors'] += 1
             raise SparkApiError(r.status_code,
                                 request=r.request,
                                 response=r)
@@ -176,29 +403,67 @@ class RestSession(object):
     def _process(self, what, url, apiattr, **kwargs):
         """ prepare the ERC list, process the argument list
             converting dates and strings
+
+            apiattr is either an Endpoint (see ciscosparkapi.endpoints)
+            or a list of the names of the body / query arguments.
         """
+        priority = kwargs.pop('priority', None)
+        if priority is not None:
+            with self.priority(priority):
+                return self._process(what, url, apiattr, **kwargs)
         # Process args
         assert isinstance(url, basestring)
-        assert isinstance(apiattr, list)
         abs_url = self.urljoin(url)
 
-        # make the response code a list if it's just an int
-        erc = kwargs.pop('erc', ERC[what])
-        if isinstance(erc, int):
-            ercList = list((erc,))
-        elif isinstance(erc, list):
-            ercList = erc
+        # the expected response codes, without 429 (API throttling)
+        erc = kwargs.pop('erc', None)
+        if isinstance(apiattr, Endpoint):
+            assert apiattr.method == what
+            ercList = apiattr.erc if erc is None else expected_codes(erc)
         else:
-            raise TypeError('unexpected response code type <%r>' % erc)
-
-        # if 429 (API throttling) is in list, remove it
-        if _API_THROTTLE_STATUS_CODE in ercList:
-            ercList.remove(_API_THROTTLE_STATUS_CODE)
-
+            assert isinstance(apiattr, list)
+            ercList = expected_codes(ERC[what] if erc is None else erc)
+
+        # read once: a profile() block may start or end on another thread
+        profiled = bool(profiling.active)
+        if profiled:
+            profiling.set_endpoint(_endpoint(what, abs_url, self._base_url))
+            start = time.time()
         # ensure proper encoding and parameter handling
-        kwargs = _process_args(what, apiattr, kwargs)
+        if isinstance(apiattr, Endpoint):
+            kwargs = _process_fields(apiattr, kwargs)
+        else:
+            kwargs = _process_args(what, apiattr, kwargs)
+        # encode the request body with the session's JSON codec
+        if 'json' in kwargs:
+            kwargs['data'] = self._codec.dumps(kwargs.pop('json'))
+        if profiled:
+            profiling.record('args', time.time() - start)
         return self._req_wrapper(what, abs_url, ercList, apiattr, **kwargs)
 
+    @contextmanager
+    def priority(self, priority):
+        """ send the requests of the calling thread with this priority.
+
+            Usage:
+                with session.priority('bulk'):
+                    ...
+
+            Single calls and list iterators can be tagged with a
+            'priority' keyword argument instead.
+        """
+        previous = getattr(self._local, 'priority', None)
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    @property
+    def current_priority(self):
+        """ the priority of the calling thread's requests, or None"""
+        return getattr(self._local, 'priority', None)
+
     @property
     def ratelimit_callback(self):
         """ get the API throttling callback"""
@@ -209,10 +474,51 @@ class RestSession(object):
         """ set the API throttling callback"""
         self._ratelimit_callback = fn
 
+    @property
+    def rate_budget(self):
+        """ the RateBudget shared by the requests, or None"""
+        return self._rate_budget
+
+    @rate_budget.setter
+    def rate_budget(self, budget):
+        """ set the RateBudget (see ciscosparkapi.ratelimit)"""
+        self._rate_budget = budget
+
+    @property
+    def codec(self):
+        """ the JSONCodec for request and response bodies"""
+        return self._codec
+
+    @codec.setter
+    def codec(self, codec):
+        """ set the JSON codec by library name or JSONCodec, see jsoncodec"""
+        self._codec = get_codec(codec)
+
+    @property
+    def circuit_breakers(self):
+        """ the CircuitBreakers of the session, or None"""
+        return self._breakers
+
+    @property
+    def coalesce(self):
+        """ are concurrent identical GET requests coalesced?"""
+        return self._singleflight is not None
+
+    @property
+    def coalesced_requests(self):
+        """ number of GET requests answered by another caller's request"""
+        return self._singleflight.shared if self._singleflight else 0
+
     @property
     def last_response(self):
-        """ retrieve the last response from the API"""
-        return self._last_response
+        """ retrieve the calling thread's last response from the API"""
+        return getattr(self._local, 'last_response', None)
+
+    @property
+    def stats(self):
+        """ request counters: requests sent, throttled (429) and errors"""
+        with self._lock:
+            return dict(self._stats)
 
     @property
     def base_url(self):
@@ -222,13 +528,17 @@ class RestSession(object):
     def access_token(self):
         return self._access_token
 
+    @property
+    def transport(self):
+        return self._transport
+
     @property
     def headers(self):
-        return self._req_session.headers.copy()
+        return self._transport.headers.copy()
 
     def update_headers(self, headers):
         assert isinstance(headers, dict)
-        self._req_session.headers.update(headers)
+        self._transport.headers.update(headers)
 
     @property
     def timeout(self):
@@ -239,17 +549,51 @@ class RestSession(object):
         assert value is None or value > 0
         self._timeout = value
 
+    def warmup(self, n, interval=None):
+        """ open n keep-alive connections to base_url in advance.
+
+            See Transport.warmup(), interval enables the background
+            health check of the idle connections.
+
+            Returns:
+                The number of connections opened.
+        """
+        return self._transport.warmup(self._base_url, n, interval)
+
     def urljoin(self, suffix_url):
         return urlparse.urljoin(self.base_url, suffix_url)
 
-    def get_pages(self, url, apiattr, **kwargs):
+    def _get_page(self, url, apiattr, sizer, **kwargs):
+        """ GET a page, feeding its latency and size to the page sizer
+
+            The latency is that of the transport only: waiting for the
+            rate budget or a 429 backoff must not shrink the pages.
+        """
         response = self._process('GET', url, apiattr, **kwargs)
+        if sizer is not None:
+            sizer.update(self._local.network_time, len(response.content))
+        return response
+
+    def _page_sizer(self, apiattr, kwargs):
+        """ a _PageSizer if the page size is to be picked adaptively"""
+        if 'max' in kwargs or 'max' not in apiattr:
+            return None
+        sizer = _PageSizer()
+        kwargs['max'] = sizer.size
+        return sizer
+
+    def _iter_responses(self, url, apiattr, sizer, priority=None, **kwargs):
+        """ GET the pages of a list request, following the 'next' links"""
+        response = self._get_page(url, apiattr, sizer, priority=priority,
+                                  **kwargs)
         while True:
-            # Process response - Yield page's JSON data
-            yield _extract_and_parse_json(response)
+            yield response
             # Get next page
             if response.links.get('next'):
                 next_url = response.links.get('next').get('url')
+                if sizer is not None:
+                    next_url = _set_url_query_part(next_url, 'max',
+                                                   sizer.size)
                 #
                 # API request - get next page
                 # FIXME: args aren't truly passed since the Spark API
@@ -261,39 +605,137 @@ class RestSession(object):
                 # precedence then?
                 #
                 #response = self._process('GET', next_url, apiattr, **kwargs)
-                response = self._process('GET', next_url, apiattr)
+                response = self._get_page(next_url, apiattr, sizer,
+                                          priority=priority)
             else:
                 raise StopIteration
 
+    def get_pages(self, url, apiattr, **kwargs):
+        """ GET all pages of a paginated list request.
+
+            Without an explicit 'max' the page size is picked adaptively
+            (see _PageSizer) and the 'max' of each 'next' link is
+            rewritten accordingly. A 'priority' applies to all pages.
+        """
+        sizer = self._page_sizer(apiattr, kwargs)
+        for response in self._iter_responses(url, apiattr, sizer, **kwargs):
+            # Process response - Yield page's JSON data
+            yield _extract_and_parse_json(response, self._codec)
+
     def get_items(self, url, apiattr, **kwargs):
-        # Get iterator for pages of JSON data
-        pages = self.get_pages(url, apiattr, **kwargs)
-        # Process pages
-        for json_page in pages:
-            # Process each page of JSON data yielding the individual JSON
-            # objects contained within the top level 'items' array
-            assert isinstance(json_page, dict)
-            # sometimes there's an empty list returned
-            # I guess this should not happen server side, but if there's
-            # a lengthy list then the last page can have zero elements
-            # and the 2nd to last page still has a 'next' link header
-            items = json_page.get(u'items', None)
-            if items is not None:
-                for item in items:
-                    yield item
-            else:
-                error_message = "'items' object not found in JSON data: %r" \
-                                % json_page
-                raise ciscosparkapiException(error_message)
+        """ GET all items of a paginated list request.
+
+            A 'priority' applies to all pages.
+
+            Returns:
+                An ItemIterator, which has a resumable cursor.
+        """
+        sizer = self._page_sizer(apiattr, kwargs)
+        return ItemIterator(
+            self._iter_responses(url, apiattr, sizer, **kwargs),
+            sizer is not None, codec=self._codec)
+
+    def resume_items(self, cursor, priority=None):
+        """ continue a get_items() iteration from a cursor.
+
+            Args:
+                cursor (dict): the 'cursor' of an ItemIterator
+                priority (string): the priority of the requests
+
+            Returns:
+                An ItemIterator yielding the remaining items.
+        """
+        sizer = _PageSizer() if cursor.get('adaptive') else None
+        return ItemIterator(self._iter_responses(cursor['url'], [], sizer,
+                                                 priority),
+                            sizer is not None, skip=cursor['index'],
+                            codec=self._codec)
+
+    def _get_response_and_json(self, url, apiattr, **kwargs):
+        response = self._process('GET', url, apiattr, **kwargs)
+        return response, _extract_and_parse_json(response, self._codec)
 
     def get(self, url, apiattr, **kwargs):
-        return _extract_and_parse_json(self._process('GET', url, apiattr, **kwargs))
+        """ GET a single JSON object.
+
+            With coalescing enabled, concurrent identical GETs (same URL
+            and arguments) share one request and the parsed JSON result,
+            which callers must therefore not modify.
+
+            If the circuit of the endpoint is open and the circuit
+            breakers serve stale results, the last good (200) result of
+            the same GET is returned, and last_response is its response.
+        """
+        priority = kwargs.pop('priority', None)
+        if priority is not None:
+            with self.priority(priority):
+                return self.get(url, apiattr, **kwargs)
+        key = _request_key('GET', self.urljoin(url), kwargs)
+        try:
+            if self._singleflight is None:
+                response, data = self._get_response_and_json(url, apiattr,
+                                                             **kwargs)
+            else:
+                response, data = self._singleflight.do(
+                    key,
+                    lambda: self._get_response_and_json(url, apiattr,
+                                                        **kwargs))
+                self._local.last_response = response
+        except SparkCircuitOpenError:
+            # serve the last good result, if configured and available
+            stale = self._breakers.stale(key)
+            if stale is None:
+                raise
+            response, data = stale
+            self._local.last_response = response
+            return data
+        if self._breakers is not None:
+            self._breakers.remember(key, response, data)
+        return data
 
     def post(self, url, apiattr, **kwargs):
-        return _extract_and_parse_json(self._process('POST', url, apiattr, **kwargs))
+        return _extract_and_parse_json(
+            self._process('POST', url, apiattr, **kwargs), self._codec)
 
     def put(self, url, apiattr, **kwargs):
-        return _extract_and_parse_json(self._process('PUT', url, apiattr, **kwargs))
+        return _extract_and_parse_json(
+            self._process('PUT', url, apiattr, **kwargs), self._codec)
+
+    def request(self, what, url, **kwargs):
+        """ send a request and return the response object itself.
+
+            kwargs are passed to the transport (e.g. data, headers,
+            stream), except for 'erc', the expected response code(s).
+        """
+        return self._process(what, url, [], **kwargs)
+
+    def post_multipart(self, url, fields, files, **kwargs):
+        """ POST a multipart/form-data body, streaming the files.
+
+            Args:
+                fields (dict): form field names and values
+                files (list): (field name, file object) tuples
+        """
+        from .attachments import MultipartStream
+        body = MultipartStream(fields, files)
+        headers = {'Content-Type': body.content_type,
+                   'Content-Length': str(len(body))}
+        return _extract_and_parse_json(
+            self._process('POST', url, [], data=body, headers=headers,
+                          **kwargs), self._codec)
+
+    def download(self, url, fp, parallel=1):
+        """ stream the content of url into the file object fp.
+
+            With parallel > 1 large files are fetched in that many byte
+            ranges concurrently (fp must be seekable).
+
+            Returns:
+                The number of bytes written.
+        """
+        from .attachments import download
+        return download(self, url, fp, parallel=parallel)
 
     def delete(self, url, apiattr, **kwargs):
-        return _extract_and_parse_json(self._process('DELETE', url, apiattr, **kwargs))
+        return _extract_and_parse_json(
+            self._process('DELETE', url, apiattr, **kwargs), self._codec)
@@ -0,0 +1,107 @@
+"""Priority classes on top of a rate budget (weighted fair queuing).
+
+A PriorityScheduler hands out the tokens of a RateBudget to waiting
+requests by priority class.  Each class gets a share of the rate
+proportional to its weight while it has requests waiting, and idle
+classes leave their share to the others.  So interactive requests get
+through quickly while a bulk crawl uses the remaining capacity.
+
+    budget = PriorityScheduler(RateBudget(5))
+    api = CiscoSparkAPI(token, rate_budget=budget)
+    api.messages.create(roomId, text='hi', priority='interactive')
+    for m in api.messages.list(roomId, priority='bulk'): ...
+    with api.session.priority('bulk'): ...
+"""
+
+
+import heapq
+import itertools
+import threading
+
+
+# priority used for untagged requests
+DEFAULT_PRIORITY = 'default'
+
+DEFAULT_WEIGHTS = {
+    'interactive': 8,
+    DEFAULT_PRIORITY: 2,
+    'bulk': 1,
+}
+
+
+class PriorityScheduler(object):
+    """Shares a rate budget between priority classes.
+
+    It can be used wherever a RateBudget can, e.g. as the rate_budget of
+    a RestSession.
+
+    Args:
+        budget (RateBudget): the budget handing out the tokens
+        weights (dict): priority class names and their (relative) weights
+    """
+
+    def __init__(self, budget, weights=None):
+        super(PriorityScheduler, self).__init__()
+        self.budget = budget
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        assert DEFAULT_PRIORITY in self.weights
+        self._cond = threading.Condition()
+        # waiting requests: (finish tag, sequence number)
+        self._queue = []
+        self._seq = itertools.count()
+        self._vtime = 0.0
+        self._finish = {}
+        self._granted = dict.fromkeys(self.weights, 0)
+
+    def acquire(self, priority=None):
+        """block until the request may be sent, by priority
+
+        Raises:
+            ValueError: If priority is not a known priority class.
+        """
+        priority = priority or DEFAULT_PRIORITY
+        if priority not in self.weights:
+            raise ValueError('unknown priority %r' % priority)
+        with self._cond:
+            # a request of a class is due 1/weight after the previous one
+            # of that class, but not before the current virtual time
+            tag = max(self._vtime, self._finish.get(priority, 0.0)) + \
+                1.0 / self.weights[priority]
+            self._finish[priority] = tag
+            ticket = (tag, next(self._seq))
+            heapq.heappush(self._queue, ticket)
+            # a new head of the queue has to take over waiting for a token
+            self._cond.notify_all()
+            try:
+                while True:
+                    if self._queue[0] == ticket:
+                        wait = self.budget.reserve()
+                        if not wait:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+            except BaseException:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._queue)
+            self._vtime = tag
+            self._granted[priority] += 1
+            self._cond.notify_all()
+
+    def embargo(self, seconds):
+        """hand out no tokens for the given number of seconds"""
+        self.budget.embargo(seconds)
+
+    @property
+    def embargoed_until(self):
+        return self.budget.embargoed_until
+
+    @property
+    def stats(self):
+        """waiting requests, and granted requests per priority class"""
+        with self._cond:
+            waiting = len(self._queue)
+            return {'waiting': waiting, 'granted': dict(self._granted)}
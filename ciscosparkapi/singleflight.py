@@ -0,0 +1,62 @@
+"""Coalescing of concurrent identical calls ('singleflight')."""
+
+
+import sys
+import threading
+
+
+class _Call(object):
+    """a call in flight, shared by the leader and all followers"""
+
+    def __init__(self):
+        super(_Call, self).__init__()
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+
+
+class SingleFlight(object):
+    """Runs only one call per key at a time.
+
+    Callers asking for a key that is already in flight wait for that call
+    and share its result (or its exception). Nothing is cached: once the
+    call returns, the next caller for the key starts a new call.
+    """
+
+    def __init__(self):
+        super(SingleFlight, self).__init__()
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._shared = 0
+
+    @property
+    def shared(self):
+        """number of calls answered by another caller's request"""
+        return self._shared
+
+    def do(self, key, fn):
+        """call fn() unless a call for key is in flight, return its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.exc_info is not None:
+                raise call.exc_info[0], call.exc_info[1], call.exc_info[2]
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception:
+            call.exc_info = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
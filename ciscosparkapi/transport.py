@@ -0,0 +1,431 @@
+"""HTTP transport backends used by RestSession.
+
+A transport does the actual HTTP work underneath RestSession._req_wrapper.
+All transports share the same small interface:
+
+    transport.headers                   default headers sent with each request
+    transport.request(method, url, ...) returns a response object
+    transport.close()                   releases pooled connections
+    transport.warmup(url, n)            opens pooled connections in advance
+
+The returned response object must provide 'status_code', 'headers',
+'content', 'url', 'links', 'request', 'json()', 'iter_content()' and
+'close()', which is the subset of requests.Response used by this
+package.  With stream=True the body is only read by iter_content().
+"""
+
+
+import json
+import urllib
+import threading
+import urlparse
+
+
+# default number of pooled (keep-alive) connections per host
+DEFAULT_POOL_SIZE = 10
+
+
+def _warm_pool(pool, n):
+    """ open up to n idle connections of a urllib3 connection pool.
+
+        Dropped idle connections are opened again, too.
+
+        Returns:
+            The number of connections opened.
+    """
+    from urllib3.exceptions import EmptyPoolError
+    conns = []
+    opened = 0
+    try:
+        for i in xrange(min(n, pool.pool.maxsize)):
+            try:
+                # closes the connection if the server dropped it
+                conn = pool._get_conn(timeout=0)
+            except EmptyPoolError:
+                # all connections are busy, so they are warm anyway
+                break
+            conns.append(conn)
+            if conn.sock is None:
+                conn.connect()
+                opened += 1
+    finally:
+        for conn in conns:
+            pool._put_conn(conn)
+    return opened
+
+
+class _Warmer(threading.Thread):
+    """keeps the idle connections of a pool open in the background"""
+
+    def __init__(self, pool, n, interval):
+        super(_Warmer, self).__init__(name='transport-warmer')
+        self.daemon = True
+        self.stopped = threading.Event()
+        self._pool = pool
+        self._n = n
+        self._interval = interval
+
+    def run(self):
+        while not self.stopped.wait(self._interval):
+            try:
+                _warm_pool(self._pool, self._n)
+            except Exception:
+                # e.g. the network is down, try again next time
+                pass
+
+
+def _parse_links(value):
+    """parse a RFC5988 'Link' header into a dict keyed by 'rel'"""
+    links = {}
+    if not value:
+        return links
+    for part in value.split(','):
+        try:
+            url, params = part.split(';', 1)
+        except ValueError:
+            url, params = part, ''
+        link = {'url': url.strip(' \'"<>')}
+        for param in params.split(';'):
+            try:
+                key, val = param.split('=', 1)
+            except ValueError:
+                continue
+            link[key.strip(' \'"')] = val.strip(' \'"')
+        links[link.get('rel') or link['url']] = link
+    return links
+
+
+def _encode_params(params):
+    """urlencode the query parameters, UTF-8 encoding unicode values"""
+    if not params:
+        return ''
+    items = []
+    for k, v in params.items():
+        if isinstance(v, unicode):
+            v = v.encode('utf-8')
+        items.append((k, v))
+    return urllib.urlencode(items)
+
+
+def _build_url(url, params):
+    """append the encoded params to the query part of url"""
+    query = _encode_params(params)
+    if not query:
+        return url
+    parts = list(urlparse.urlsplit(url))
+    parts[3] = '&'.join(filter(None, (parts[3], query)))
+    return urlparse.urlunsplit(parts)
+
+
+def _normalize_url(url):
+    """url with sorted query parameters, for matching urls"""
+    parts = list(urlparse.urlsplit(url))
+    parts[3] = urllib.urlencode(sorted(urlparse.parse_qsl(parts[3])))
+    return urlparse.urlunsplit(parts)
+
+
+def _json_dumps(data):
+    return json.dumps(data)
+
+
+def _json_loads(data):
+    return json.loads(data)
+
+
+class _Headers(dict):
+    """minimal case-insensitive header dict"""
+
+    def __init__(self, data=None):
+        super(_Headers, self).__init__()
+        if data:
+            self.update(data)
+
+    def __setitem__(self, key, value):
+        super(_Headers, self).__setitem__(key.lower(), value)
+
+    def __getitem__(self, key):
+        return super(_Headers, self).__getitem__(key.lower())
+
+    def __contains__(self, key):
+        return super(_Headers, self).__contains__(key.lower())
+
+    def get(self, key, default=None):
+        return super(_Headers, self).get(key.lower(), default)
+
+    def update(self, data):
+        for k, v in dict(data).items():
+            self[k] = v
+
+    def copy(self):
+        return _Headers(self)
+
+
+class TransportRequest(object):
+    """the request as it was sent by a non-requests transport"""
+
+    def __init__(self, method, url, headers, body):
+        super(TransportRequest, self).__init__()
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.body = body
+
+
+class TransportResponse(object):
+    """a requests.Response look-alike returned by non-requests transports
+
+    Either the content or, for streamed responses, a 'raw' file-like
+    object to read the content from is given.
+    """
+
+    def __init__(self, status_code, headers, content, url, request=None,
+                 raw=None):
+        super(TransportResponse, self).__init__()
+        self.status_code = status_code
+        self.headers = _Headers(headers)
+        self._content = content
+        self.raw = raw
+        self.url = url
+        self.request = request
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = self.raw.read() if self.raw is not None else ''
+        return self._content
+
+    @property
+    def links(self):
+        return _parse_links(self.headers.get('link'))
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        if self._content is not None or self.raw is None:
+            content = self.content
+            for i in xrange(0, len(content), chunk_size):
+                yield content[i:i + chunk_size]
+            return
+        while True:
+            chunk = self.raw.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        if self.raw is not None:
+            self.raw.close()
+
+
+class Transport(object):
+    """Base class for all transports."""
+
+    def __init__(self):
+        super(Transport, self).__init__()
+        self.headers = _Headers()
+        self._warmers = []
+
+    def request(self, method, url, params=None, json=None, data=None,
+                headers=None, timeout=None, stream=False):
+        raise NotImplementedError
+
+    def _connection_pool(self, url):
+        """ the urllib3 connection pool for url, None if there is none"""
+        return None
+
+    def warmup(self, url, n, interval=None):
+        """ open n keep-alive connections to the host of url in advance,
+            so the first requests skip the DNS, TCP and TLS handshakes.
+
+            Args:
+                url (string): e.g. the base URL of the API
+                n (int): number of connections, at most the pool size
+                interval (float): if set, check the idle connections in
+                    the background every interval seconds and open
+                    dropped ones again
+
+            Returns:
+                The number of connections opened.
+        """
+        pool = self._connection_pool(url)
+        if pool is None:
+            return 0
+        opened = _warm_pool(pool, n)
+        if interval:
+            warmer = _Warmer(pool, n, interval)
+            self._warmers.append(warmer)
+            warmer.start()
+        return opened
+
+    def close(self):
+        for warmer in self._warmers:
+            warmer.stopped.set()
+        self._warmers = []
+
+
+class RequestsTransport(Transport):
+    """Transport using a requests session (the default).
+
+    Args:
+        pool_connections (int): number of host connection pools to cache
+        pool_maxsize (int): maximum number of keep-alive connections per host
+        pool_block (bool): block when no free connection is in the pool
+        keep_alive (bool): reuse connections between requests
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_SIZE,
+                 pool_maxsize=DEFAULT_POOL_SIZE, pool_block=False,
+                 keep_alive=True):
+        super(RequestsTransport, self).__init__()
+        import requests
+        self._session = requests.session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        self.headers = self._session.headers
+        if not keep_alive:
+            self.headers['Connection'] = 'close'
+
+    def request(self, method, url, params=None, json=None, data=None,
+                headers=None, timeout=None, stream=False):
+        return self._session.request(method, url, params=params, json=json,
+                                     data=data, headers=headers,
+                                     timeout=timeout, stream=stream)
+
+    def _connection_pool(self, url):
+        adapter = self._session.get_adapter(url)
+        return adapter.poolmanager.connection_from_url(url)
+
+    def close(self):
+        super(RequestsTransport, self).close()
+        self._session.close()
+
+
+class Urllib3Transport(Transport):
+    """Transport using a raw urllib3 connection pool.
+
+    Skips the per-request overhead of requests (hooks, adapters,
+    cookie handling).
+
+    Args:
+        maxsize (int): maximum number of keep-alive connections per host
+        block (bool): block when no free connection is in the pool
+        keep_alive (bool): reuse connections between requests
+    """
+
+    def __init__(self, maxsize=DEFAULT_POOL_SIZE, block=False,
+                 keep_alive=True):
+        super(Urllib3Transport, self).__init__()
+        import urllib3
+        self._pool = urllib3.PoolManager(maxsize=maxsize, block=block,
+                                         retries=False)
+        self.headers['Accept'] = '*/*'
+        if not keep_alive:
+            self.headers['Connection'] = 'close'
+
+    def request(self, method, url, params=None, json=None, data=None,
+                headers=None, timeout=None, stream=False):
+        full_url = _build_url(url, params)
+        request_headers = self.headers.copy()
+        request_headers.update(headers or {})
+        body = data
+        if json is not None:
+            body = _json_dumps(json)
+        r = self._pool.urlopen(method, full_url, body=body,
+                               headers=request_headers, timeout=timeout,
+                               retries=False, redirect=False,
+                               preload_content=not stream)
+        request = TransportRequest(method, full_url, request_headers, body)
+        if stream:
+            return TransportResponse(r.status, r.headers, None, full_url,
+                                     request=request, raw=r)
+        return TransportResponse(r.status, r.headers, r.data, full_url,
+                                 request=request)
+
+    def _connection_pool(self, url):
+        return self._pool.connection_from_url(url)
+
+    def close(self):
+        super(Urllib3Transport, self).close()
+        self._pool.clear()
+
+
+class MemoryTransport(Transport):
+    """In-memory transport for tests; no network access at all.
+
+    Responses are registered per method and URL with add(), the order of
+    the query parameters does not matter. Registered
+    responses are served in order; the last one is repeated.  Requests
+    without a registered response get a 404.  Every request is recorded
+    in 'calls' as a (method, url, json) tuple, where url includes the
+    encoded query parameters and json is the decoded request body (or
+    the raw body if it is not JSON).
+
+    A HEAD request without a registered response is answered from the
+    GET response, and 'Range: bytes=a-b' requests get a 206 with the
+    requested part of the content.
+    """
+
+    def __init__(self):
+        super(MemoryTransport, self).__init__()
+        self._lock = threading.Lock()
+        self._responses = {}
+        self.calls = []
+
+    def add(self, method, url, json=None, status=200, headers=None,
+            content=None):
+        """register a response (JSON or raw content) for method and url"""
+        if content is None:
+            content = _json_dumps(json) if json is not None else ''
+        self._responses.setdefault((method, _normalize_url(url)), []).append(
+            (status, headers or {}, content))
+
+    def _lookup(self, method, url, full_url):
+        for key in ((method, _normalize_url(full_url)),
+                    (method, _normalize_url(url))):
+            queue = self._responses.get(key)
+            if queue:
+                return queue.pop(0) if len(queue) > 1 else queue[0]
+        return None
+
+    def request(self, method, url, params=None, json=None, data=None,
+                headers=None, timeout=None, stream=False):
+        full_url = _build_url(url, params)
+        body = data.read() if hasattr(data, 'read') else data
+        if json is None and body:
+            try:
+                json = _json_loads(body)
+            except ValueError:
+                json = body
+        headers = _Headers(headers or {})
+        with self._lock:
+            self.calls.append((method, full_url, json))
+            response = self._lookup(method, url, full_url)
+            if response is None and method == 'HEAD':
+                response = self._lookup('GET', url, full_url)
+                if response is not None:
+                    status, response_headers, content = response
+                    response_headers = dict(response_headers)
+                    response_headers['Content-Length'] = str(len(content))
+                    response_headers['Accept-Ranges'] = 'bytes'
+                    response = (status, response_headers, '')
+        if response is None:
+            response = (404, {}, '{"message": "not found"}')
+        status, response_headers, content = response
+        byte_range = headers.get('Range')
+        if status == 200 and byte_range and byte_range.startswith('bytes='):
+            first, last = byte_range[6:].split('-')
+            last = int(last) if last else len(content) - 1
+            response_headers = dict(response_headers)
+            response_headers['Content-Range'] = 'bytes %s-%d/%d' % \
+                (first, last, len(content))
+            status, content = 206, content[int(first):last + 1]
+        request_headers = self.headers.copy()
+        request_headers.update(headers)
+        request = TransportRequest(method, full_url, request_headers, body)
+        return TransportResponse(status, response_headers, content, full_url,
+                                 request=request)
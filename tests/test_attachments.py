@@ -0,0 +1,35 @@
+"""Streamed multipart uploads.
+
+Run with: python -m unittest discover -s tests
+"""
+
+import unittest
+from StringIO import StringIO
+from ciscosparkapi import MemoryTransport
+from ciscosparkapi.restsession import RestSession
+
+
+URL = 'https://api.ciscospark.com/v1/messages'
+
+
+class PostMultipartTest(unittest.TestCase):
+
+    def test_retry_after_throttling_sends_the_whole_body(self):
+        transport = MemoryTransport()
+        transport.add('POST', URL, {}, status=429,
+                      headers={'Retry-After': '1'})
+        transport.add('POST', URL, {'id': 'm1'})
+        session = RestSession('token', transport=transport)
+        session.ratelimit_callback = lambda seconds: True
+        fp = StringIO('x' * 100000)
+        fp.name = 'x.txt'
+        result = session.post_multipart('messages', {'roomId': 'r1'},
+                                        [('files', fp)])
+        self.assertEqual(result, {'id': 'm1'})
+        first, second = [body for _, _, body in transport.calls]
+        self.assertEqual(len(first), len(second))
+        self.assertIn('x' * 100000, second)
+
+
+if __name__ == '__main__':
+    unittest.main()
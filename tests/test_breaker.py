@@ -0,0 +1,82 @@
+"""Stale results of circuit breakers.
+
+Run with: python -m unittest discover -s tests
+"""
+
+import time
+import unittest
+from ciscosparkapi import CiscoSparkAPI, MemoryTransport, CircuitBreakers, \
+    RateBudget, PriorityScheduler
+from ciscosparkapi.breaker import CircuitBreaker, CLOSED, HALF_OPEN
+from ciscosparkapi.exceptions import SparkApiError, SparkCircuitOpenError
+
+
+B = 'https://api.ciscospark.com/v1/'
+
+
+class ServeStaleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = MemoryTransport()
+        self.api = CiscoSparkAPI(
+            'token', transport=self.transport,
+            circuit_breakers=CircuitBreakers(serve_stale=True, min_calls=3))
+
+    def _open_circuit(self, url):
+        breakers = self.api.session.circuit_breakers
+        while 'open' not in breakers.states().values():
+            self.assertRaises(SparkApiError, self.api.session.get, url, [])
+
+    def test_stale_result_sets_last_response(self):
+        url = B + 'people/p1'
+        self.transport.add('GET', url, {'id': 'p1', 'displayName': 'P'})
+        self.transport.add('GET', url, {'message': 'down'}, status=503)
+        self.assertEqual(self.api.people.details('p1').displayName, 'P')
+        self._open_circuit(url)
+        # the 503s have been the last responses
+        person = self.api.people.details('p1')
+        self.assertEqual(person.displayName, 'P')
+        self.assertEqual(self.api.session.last_response.status_code, 200)
+
+    def test_not_found_is_not_served_stale(self):
+        url = B + 'people/p2'
+        self.transport.add('GET', url, {'message': 'not found'}, status=404)
+        self.transport.add('GET', url, {'message': 'down'}, status=503)
+        self.assertIsNone(self.api.people.details('p2'))
+        self.api.people.not_found.clear()
+        self._open_circuit(url)
+        self.assertRaises(SparkCircuitOpenError, self.api.people.details,
+                          'p2')
+
+
+class ProbeTest(unittest.TestCase):
+
+    def test_failed_budget_acquire_takes_no_probe(self):
+        transport = MemoryTransport()
+        url = B + 'rooms/r1'
+        transport.add('GET', url, {'message': 'down'}, status=503)
+        transport.add('GET', url, {'id': 'r1'})
+        breakers = CircuitBreakers(min_calls=1, open_time=0.05)
+        api = CiscoSparkAPI('token', transport=transport,
+                            circuit_breakers=breakers,
+                            rate_budget=PriorityScheduler(RateBudget(1000)))
+        self.assertRaises(SparkApiError, api.session.get, url, [])
+        time.sleep(0.06)
+        self.assertRaises(ValueError, api.session.get, url, [],
+                          priority='typo')
+        self.assertEqual(api.session.get(url, []), {'id': 'r1'})
+        self.assertEqual(breakers.states().values(), [CLOSED])
+
+    def test_release(self):
+        breaker = CircuitBreaker(min_calls=1, open_time=0)
+        self.assertTrue(breaker.allow())
+        breaker.record(False, 0)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.release()
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""Crawling rooms in worker processes.
+
+Run with: python -m unittest discover -s tests
+"""
+
+import pickle
+import unittest
+from ciscosparkapi import MemoryTransport, Room
+from ciscosparkapi.crawl import crawl
+from ciscosparkapi.exceptions import SparkApiError, SparkCircuitOpenError
+
+
+B = 'https://api.ciscospark.com/v1/'
+
+
+class _Response(object):
+
+    status_code = 404
+    text = ''
+    request = None
+
+    def json(self):
+        return {'message': 'not found'}
+
+
+class PickleTest(unittest.TestCase):
+
+    def test_api_error(self):
+        error = pickle.loads(pickle.dumps(SparkApiError(
+            404, response=_Response())))
+        self.assertEqual(error.response_code, 404)
+        self.assertEqual(error.response_text, 'not found')
+        self.assertEqual(str(error), 'Response Code [404] - not found')
+        self.assertIsNone(error.response)
+
+    def test_circuit_open_error(self):
+        error = pickle.loads(pickle.dumps(
+            SparkCircuitOpenError('GET rooms', 12.5)))
+        self.assertEqual((error.endpoint, error.retry_at),
+                         ('GET rooms', 12.5))
+
+
+class CrawlTest(unittest.TestCase):
+
+    def test_crawl(self):
+        transport = MemoryTransport()
+        transport.add('GET', B + 'messages?roomId=r1&max=1000',
+                      {'items': [{'id': 'm1', 'roomId': 'r1'}]})
+        results = list(crawl('token', rooms=[Room({'id': 'r1'})],
+                             processes=1, transport=transport))
+        (room, messages), = results
+        self.assertEqual(room.id, 'r1')
+        self.assertEqual([m.id for m in messages], ['m1'])
+
+    def test_failing_room_raises(self):
+        # no registered responses: every request gets a 404
+        results = crawl('token', rooms=[Room({'id': 'r1'})], processes=1,
+                        transport=MemoryTransport())
+        with self.assertRaises(SparkApiError) as context:
+            list(results)
+        self.assertEqual(context.exception.response_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""Identity map together with the room index and the membership graph.
+
+Run with: python -m unittest discover -s tests
+"""
+
+import unittest
+from ciscosparkapi import CiscoSparkAPI, MemoryTransport
+from ciscosparkapi.cache import IdentityMap
+
+
+B = 'https://api.ciscospark.com/v1/'
+
+R1 = {'id': 'r1', 'title': 'A', 'type': 'group',
+      'lastActivity': '2016-01-01T00:00:00.000Z'}
+R2 = {'id': 'r2', 'title': 'B', 'type': 'group',
+      'lastActivity': '2016-01-02T00:00:00.000Z'}
+
+
+class IdentityMapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = MemoryTransport()
+        self.api = CiscoSparkAPI('token', transport=self.transport,
+                                 identity_map=True)
+
+    def test_room_index_refresh_after_rename(self):
+        self.transport.add('GET', B + 'rooms?max=1000', {'items': [R1, R2]})
+        index = self.api.rooms.index
+        renamed = dict(R2, title='B2',
+                       lastActivity='2016-01-03T00:00:00.000Z')
+        self.transport.add('GET', B + 'rooms?sortBy=lastactivity&max=100',
+                           {'items': [renamed, R1]})
+        self.assertEqual(index.refresh(), 1)
+        self.assertEqual([r.id for r in index.by_title('B2')], ['r2'])
+        self.assertEqual(index.by_title('B'), [])
+        self.assertIs(index.get('r2'), self.api.rooms.index.by_title('B2')[0])
+
+    def test_membership_graph_after_update_in_place(self):
+        membership = {'id': 'm1', 'roomId': 'r1', 'personId': 'p1',
+                      'personEmail': 'a@example.com'}
+        self.transport.add('GET', B + 'memberships?roomId=r1&max=1000',
+                           {'items': [membership]})
+        self.transport.add('GET', B + 'memberships/m1',
+                           dict(membership, personId='p2',
+                                personEmail='b@example.com'))
+        graph = self.api.memberships.graph
+        self.assertTrue(graph.is_member('r1', 'a@example.com'))
+        graph.add(self.api.memberships.details('m1'))
+        self.assertFalse(graph.is_member('r1', 'a@example.com'))
+        self.assertFalse(graph.is_member('r1', 'p1'))
+        self.assertTrue(graph.is_member('r1', 'b@example.com'))
+        self.assertEqual(graph.rooms_of('p2'), set(['r1']))
+
+
+class InternTest(unittest.TestCase):
+
+    def test_only_references_are_interned(self):
+        identity_map = IdentityMap()
+        data = identity_map._intern_data({'id': u'm1', 'roomId': u'r1',
+                                          'text': u'hello'})
+        self.assertEqual(data, {'id': u'm1', 'roomId': u'r1',
+                                'text': u'hello'})
+        self.assertEqual(identity_map.stats['strings'], 1)
+
+    def test_table_is_bounded(self):
+        identity_map = IdentityMap(max_strings=10)
+        for i in range(25):
+            identity_map.intern(u'p%d' % i)
+        self.assertLessEqual(identity_map.stats['strings'], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+"""Import time budget and lazy imports of the package.
+
+Run with: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import subprocess
+import unittest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# prints the import time (ms) and the heavy dependencies it imported
+_SCRIPT = '''
+import sys, time
+start = time.time()
+import ciscosparkapi
+elapsed = (time.time() - start) * 1000
+heavy = [m for m in ('requests', 'urllib3', 'dateutil') if m in sys.modules]
+sys.stdout.write('%f %d %s' % (elapsed, ciscosparkapi.IMPORT_TIME_BUDGET,
+                               ','.join(heavy)))
+'''
+
+# the best of this many fresh interpreters counts
+_RUNS = 5
+
+
+def _import():
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.check_output([sys.executable, '-c', _SCRIPT],
+                                     cwd=ROOT, env=env)
+    elapsed, budget, heavy = (output.split(' ') + [''])[:3]
+    return float(elapsed), int(budget), [m for m in heavy.split(',') if m]
+
+
+class ImportTest(unittest.TestCase):
+
+    def test_import_time_budget(self):
+        # the first import writes the bytecode
+        _import()
+        results = [_import() for i in range(_RUNS)]
+        best = min(elapsed for elapsed, _, _ in results)
+        budget = results[0][1]
+        self.assertLessEqual(best, budget,
+                             'import ciscosparkapi took %.1f ms, the '
+                             'budget is %d ms' % (best, budget))
+
+    def test_no_heavy_dependencies(self):
+        _, _, heavy = _import()
+        self.assertEqual(heavy, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+"""Membership updates.
+
+Run with: python -m unittest discover -s tests
+"""
+
+import unittest
+from ciscosparkapi import CiscoSparkAPI, MemoryTransport, Room
+
+
+B = 'https://api.ciscospark.com/v1/'
+
+M1 = {'id': 'm1', 'roomId': 'r1', 'personId': 'p1',
+      'personEmail': 'a@example.com', 'isModerator': False}
+
+
+class UpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = MemoryTransport()
+        self.api = CiscoSparkAPI('token', transport=self.transport,
+                                 identity_map=True)
+
+    def test_update_by_id(self):
+        self.transport.add('PUT', B + 'memberships/m1',
+                           dict(M1, isModerator=True))
+        membership = self.api.memberships.update('m1', isModerator=True)
+        self.assertTrue(membership.isModerator)
+        self.assertEqual(self.transport.calls[0][2], {'isModerator': True})
+        self.assertRaises(ValueError, self.api.memberships.update, 'm1')
+
+    def test_failed_promotion_keeps_the_membership(self):
+        self.transport.add('GET', B + 'memberships?roomId=r1&max=1000',
+                           {'items': [M1]})
+        self.transport.add('PUT', B + 'memberships/m1', {'message': 'no'},
+                           status=403)
+        members = list(self.api.memberships.list(room=Room({'id': 'r1'})))
+        diff = self.api.memberships.reconcile(
+            Room({'id': 'r1'}), ['a@example.com'],
+            moderators=['a@example.com'], remove=False)
+        self.assertEqual([name for name, _, _ in diff.errors], ['promote'])
+        self.assertFalse(members[0].isModerator)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+"""Bounds of the message listing.
+
+Run with: python -m unittest discover -s tests
+"""
+
+import unittest
+from datetime import datetime
+from ciscosparkapi import CiscoSparkAPI, MemoryTransport, Room, Message
+
+
+B = 'https://api.ciscospark.com/v1/'
+
+
+def _message(i, created):
+    return {'id': 'm%d' % i, 'roomId': 'r1', 'created': created}
+
+
+class ListTest(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = MemoryTransport()
+        self.api = CiscoSparkAPI('token', transport=self.transport)
+        self.room = Room({'id': 'r1'})
+
+    def test_until_is_kept_with_before_message(self):
+        self.transport.add('GET', B + 'messages?roomId=r1&max=1000&'
+                           'before=2016-01-01T00:00:00.000Z', {'items': []})
+        before = Message(_message(9, '2016-06-01T00:00:00.000Z'))
+        list(self.api.messages.list(self.room, beforeMessage=before,
+                                    until=datetime(2016, 1, 1)))
+        self.assertIn('before=2016-01-01', self.transport.calls[0][1])
+
+    def test_resume_with_since(self):
+        self.transport.add('GET', B + 'messages?roomId=r1&max=1000', {
+            'items': [_message(1, '2016-03-01T00:00:00.000Z'),
+                      _message(2, '2016-02-01T00:00:00.000Z'),
+                      _message(3, '2015-12-01T00:00:00.000Z')]})
+        since = datetime(2016, 1, 1)
+        messages = self.api.messages.list(self.room, since=since)
+        self.assertEqual(next(messages).id, 'm1')
+        messages = self.api.messages.resume(messages.cursor, since=since)
+        self.assertEqual([m.id for m in messages], ['m2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""Which send failures the outbox retries.
+
+Run with: python -m unittest discover -s tests
+"""
+
+import os
+import json
+import socket
+import shutil
+import tempfile
+import unittest
+from ciscosparkapi import CiscoSparkAPI, MemoryTransport, Room
+from ciscosparkapi.exceptions import SparkApiError, SparkCircuitOpenError
+from ciscosparkapi.outbox import _temporary
+
+
+class _Response(object):
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = ''
+        self.request = None
+
+    def json(self):
+        return {}
+
+
+def _api_error(status):
+    return SparkApiError(status, response=_Response(status))
+
+
+class TemporaryTest(unittest.TestCase):
+
+    def test_temporary(self):
+        html = _Response(502)
+        html.json = lambda: json.loads('<html>')
+        for error in (_api_error(429), _api_error(503),
+                      SparkApiError(502, response=html),
+                      socket.error('connection reset'),
+                      SparkCircuitOpenError('POST messages', 0)):
+            self.assertTrue(_temporary(error), error)
+
+    def test_requests_errors(self):
+        try:
+            import requests
+        except ImportError:
+            self.skipTest('requests is not installed')
+        self.assertTrue(_temporary(requests.exceptions.ConnectionError()))
+        self.assertTrue(_temporary(requests.exceptions.ReadTimeout()))
+        self.assertFalse(_temporary(requests.exceptions.InvalidURL()))
+
+    def test_permanent(self):
+        for error in (_api_error(400), _api_error(404),
+                      ValueError('bad argument'), TypeError(),
+                      AssertionError()):
+            self.assertFalse(_temporary(error), error)
+
+
+class OutboxTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_html_gateway_error_is_retried(self):
+        transport = MemoryTransport()
+        url = 'https://api.ciscospark.com/v1/messages'
+        transport.add('POST', url, status=502,
+                      content='<html><body>502 Bad Gateway</body></html>')
+        transport.add('POST', url, {'id': 'm1'})
+        api = CiscoSparkAPI('token', transport=transport)
+        results = []
+        outbox = api.messages.enable_outbox(
+            os.path.join(self.directory, 'outbox.db'), backoff=0.01,
+            callback=lambda *args: results.append(args))
+        try:
+            api.messages.create(Room({'id': 'r1'}), text='hi')
+            self.assertTrue(outbox.flush(5))
+        finally:
+            api.messages.disable_outbox()
+        (_, message, error), = results
+        self.assertIsNone(error)
+        self.assertEqual(message.id, 'm1')
+        self.assertEqual(len(transport.calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
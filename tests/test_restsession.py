@@ -0,0 +1,54 @@
+"""Request loop of the RestSession.
+
+Run with: python -m unittest discover -s tests
+"""
+
+import time
+import unittest
+from ciscosparkapi import MemoryTransport, restsession
+from ciscosparkapi.endpoints import ENDPOINTS
+from ciscosparkapi.restsession import RestSession
+
+
+B = 'https://api.ciscospark.com/v1/'
+
+
+class _SlowBudget(object):
+    """a rate budget which makes every request wait"""
+
+    def __init__(self, wait):
+        self.wait = wait
+
+    def acquire(self, priority=None):
+        time.sleep(self.wait)
+
+    def embargo(self, seconds):
+        pass
+
+
+class PageSizeTest(unittest.TestCase):
+
+    def setUp(self):
+        self._target = restsession._PAGE_LATENCY_TARGET
+        restsession._PAGE_LATENCY_TARGET = 0.02
+
+    def tearDown(self):
+        restsession._PAGE_LATENCY_TARGET = self._target
+
+    def test_waiting_for_the_budget_does_not_shrink_pages(self):
+        transport = MemoryTransport()
+        transport.add('GET', B + 'rooms?max=1000', {'items': [{'id': 'r1'}]},
+                      headers={'Link': '<%srooms?max=1000&page=2>; '
+                                       'rel="next"' % B})
+        transport.add('GET', B + 'rooms?max=1000&page=2',
+                      {'items': [{'id': 'r2'}]})
+        session = RestSession('token', transport=transport,
+                              rate_budget=_SlowBudget(0.05))
+        endpoint = ENDPOINTS['rooms.list']
+        items = list(session.get_items(endpoint.url(), endpoint))
+        self.assertEqual([item['id'] for item in items], ['r1', 'r2'])
+        self.assertIn('max=1000', transport.calls[1][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""Serialization of Spark objects.
+
+Run with: python -m unittest discover -s tests
+"""
+
+import json
+import types
+import unittest
+from StringIO import StringIO
+from ciscosparkapi import Room, Person, dumps_many, loads_many
+from ciscosparkapi.jsoncodec import JSONCodec
+
+
+def _codec(name):
+    """a JSONCodec of the stdlib json, counting its dumps() calls"""
+    module = types.ModuleType(name)
+    module.calls = []
+
+    def dumps(data):
+        module.calls.append(data)
+        return json.dumps(data)
+    module.dumps = dumps
+    module.loads = json.loads
+    return JSONCodec(module), module.calls
+
+
+class DumpsManyTest(unittest.TestCase):
+
+    def tearDown(self):
+        del Room._codec
+
+    def test_class_codec(self):
+        codec, calls = _codec('roomjson')
+        Room.set_codec(codec)
+        fp = StringIO()
+        count = dumps_many([Room({'id': 'r1', 'title': 'A'}),
+                            Person({'id': 'p1'})], fp)
+        self.assertEqual(count, 2)
+        # only the Room is written with the codec of its class
+        self.assertEqual(calls, [{'id': 'r1', 'title': 'A'}])
+        fp.seek(0)
+        rooms = list(loads_many(Room, [fp.readline()]))
+        self.assertEqual(rooms[0].title, 'A')
+
+
+if __name__ == '__main__':
+    unittest.main()